@@ -2,10 +2,15 @@
 Package that incorporates Class definition needed to access the DataworkZ API
 """
 
+import asyncio
 import os
+import random
 import urllib.parse
 
+import aiohttp
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 import logging
 
 logger = logging.getLogger()
@@ -17,7 +22,12 @@ class DataworkzAPI:
     """
 
     def __init__(
-        self, token_var="DATAWORKZ_API_TOKEN", service_url="DATAWORKZ_SERVICE_URL"
+        self,
+        token_var="DATAWORKZ_API_TOKEN",
+        service_url="DATAWORKZ_SERVICE_URL",
+        max_concurrency: int = 8,
+        max_rate_limit_retries: int = 5,
+        pool_size: int = 64,
     ):
         self.token: str = str(os.getenv(token_var))
         if self.token == "":
@@ -29,6 +39,37 @@ class DataworkzAPI:
             "Content-Type": "application/json",
             "Authorization": "SSWS " + self.token,
         }
+        # URL templates of the endpoints that are called for every question
+        systems_url = self.service_url + "/api/qna/v1/systems/{system_id}"
+        self._answer_url_tmpl: str = systems_url + "/answer"
+        self._search_url_tmpl: str = systems_url + "/search"
+        self._question_url_tmpl: str = systems_url + "/questions/{question_id}"
+        # keep-alive connections are pooled and reused across all requests
+        self.pool_size: int = pool_size
+        self.session: requests.Session = requests.Session()
+        self.session.headers.update(self.authorization_header)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # the async session is opened on entering the client with `async with`
+        self.max_concurrency: int = max_concurrency
+        self.max_rate_limit_retries: int = max_rate_limit_retries
+        self.async_session: aiohttp.ClientSession | None = None
+        self.semaphore: asyncio.Semaphore | None = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit_per_host=self.pool_size, keepalive_timeout=300
+        )
+        self.async_session = aiohttp.ClientSession(
+            connector=connector, headers=self.authorization_header
+        )
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.async_session.close()
+        self.async_session = None
 
     def get_response(self, uri: str, auth_header: dict, timeout: int):
         """
@@ -36,9 +77,9 @@ class DataworkzAPI:
         The response is None if an error occurs
         """
         try:
-            response = requests.get(uri, headers=auth_header, timeout=timeout)
+            response = self.session.get(uri, headers=auth_header, timeout=timeout)
             response.raise_for_status()
-            return response.json()
+            return orjson.loads(response.content)
         except requests.exceptions.HTTPError as http_err:
             logger.error(f"ERROR: HTTP Error occured: {http_err}")
         except requests.exceptions.ConnectionError as conn_err:
@@ -47,8 +88,61 @@ class DataworkzAPI:
             logger.error(f"ERROR: Timeout error occurred: {timeout_err}")
         except requests.exceptions.RequestException as req_err:
             logger.error(f"ERROR: Request error occurred: {req_err}")
+        except orjson.JSONDecodeError as json_err:
+            logger.error(f"ERROR: Invalid JSON response: {json_err}")
+        return None
+
+    async def get_response_async(self, uri: str, timeout: int):
+        """
+        Async version of get_response using the pooled aiohttp session. At most
+        max_concurrency requests are in flight at any time. Requests rejected with
+        HTTP 429 are retried after the Retry-After delay, backing off exponentially
+        The response is None if an error occurs
+        """
+        if self.async_session is None:
+            raise RuntimeError("ERROR: DataworkzAPI session is not open")
+        try:
+            for attempt in range(self.max_rate_limit_retries + 1):
+                async with self.semaphore:
+                    async with self.async_session.get(
+                        uri, timeout=aiohttp.ClientTimeout(total=timeout)
+                    ) as response:
+                        if (
+                            response.status != 429
+                            or attempt == self.max_rate_limit_retries
+                        ):
+                            response.raise_for_status()
+                            # the probe makes the responses large, parse them with orjson
+                            return await response.json(loads=orjson.loads)
+                        retry_after = self.get_retry_after(response.headers)
+                # back off outside of the semaphore so other requests can proceed
+                delay = retry_after * 2**attempt + random.uniform(0, retry_after)
+                logger.debug(f"Rate limited by DTWZ AI API, retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+        except aiohttp.ClientResponseError as http_err:
+            logger.error(f"ERROR: HTTP Error occured: {http_err}")
+        except asyncio.TimeoutError as timeout_err:
+            logger.error(f"ERROR: Timeout error occurred: {timeout_err}")
+        except aiohttp.ClientConnectionError as conn_err:
+            logger.error(f"ERROR: Connection error occurred: {conn_err}")
+        except aiohttp.ClientError as req_err:
+            logger.error(f"ERROR: Request error occurred: {req_err}")
+        except orjson.JSONDecodeError as json_err:
+            logger.error(f"ERROR: Invalid JSON response: {json_err}")
         return None
 
+    @staticmethod
+    def get_retry_after(headers, default: float = 1.0) -> float:
+        """
+        Returns the delay in seconds from the Retry-After header of a response,
+        falling back to default when the header is missing or is not a positive number
+        """
+        try:
+            retry_after = float(headers.get("Retry-After", default))
+        except ValueError:
+            return default
+        return retry_after if retry_after > 0 else default
+
     def get_qna_systems(self):
         """
         function call for getting all the QNZ systems or RAG apps configured in the Dataworkz system
@@ -117,7 +211,7 @@ class DataworkzAPI:
             raise RuntimeError("ERROR: No question history details found")
         return response
 
-    def get_answer(
+    async def get_answer(
         self,
         system_id: str,
         query: str,
@@ -133,38 +227,36 @@ class DataworkzAPI:
         returns the json response containing the LLM answer and the probe data by default
         raises an exception in case of HTTP errors
         """
-        api_url = (
-            self.service_url
-            + "/api/qna/v1/systems/"
-            + system_id
-            + "/answer?questionText="
-        )
-        # write a line of code to encode a string into a UTF-8 for use in a URL
-        query_encoded = urllib.parse.quote(query)
-        api_url = api_url + query_encoded + "&llmProviderId=" + llm_provider_id
+        params = {"questionText": query, "llmProviderId": llm_provider_id}
         if results_filter is not None:
-            api_url = api_url + "&filter=" + results_filter
+            params["filter"] = results_filter
         if properties is not None:
-            api_url = api_url + "&properties=" + properties
-        response = self.get_response(api_url, self.authorization_header, 2400)
+            params["properties"] = properties
+        # percent-encode the parameters as UTF-8 for use in a URL
+        api_url = (
+            self._answer_url_tmpl.format(system_id=system_id)
+            + "?"
+            + urllib.parse.urlencode(params, quote_via=urllib.parse.quote)
+        )
+        response = await self.get_response_async(api_url, 2400)
         if response is None:
             logger.error(f"ERROR: Answer system unavailable")
             return None
         return response
 
-    def get_search(self, system_id: str, query: str):
+    async def get_search(self, system_id: str, query: str):
         """
         function to get the retrieved chunks from the RAG app identified by system_id
         returns the json response containing the LLM answer and the probe data by default
         raises an exception in case of HTTP errors
         """
+        # percent-encode the query as UTF-8 for use in a URL
         api_url = (
-            self.service_url + "/api/qna/v1/systems/" + system_id + "/search?query="
+            self._search_url_tmpl.format(system_id=system_id)
+            + "?"
+            + urllib.parse.urlencode({"query": query}, quote_via=urllib.parse.quote)
         )
-        # write a line of code to encode a string into a UTF-8 for use in a URL
-        query_encoded = urllib.parse.quote(query)
-        api_url = api_url + query_encoded
-        response = self.get_response(api_url, self.authorization_header, 2400)
+        response = await self.get_response_async(api_url, 2400)
         if response is None:
             logger.error(f"ERROR: Retrieval system unavailable")
             return None
@@ -176,12 +268,8 @@ class DataworkzAPI:
         returns the json response containing the LLM answer and the probe data by default
         raises an exception in case of HTTP errors
         """
-        api_url = (
-            self.service_url
-            + "/api/qna/v1/systems/"
-            + system_id
-            + "/questions/"
-            + question_id
+        api_url = self._question_url_tmpl.format(
+            system_id=system_id, question_id=question_id
         )
         response = self.get_response(api_url, self.authorization_header, 2400)
         if response is None:
@@ -1,25 +1,53 @@
-import time
+import asyncio
+import contextlib
+import threading
+from functools import cached_property
+from tenacity import retry, retry_if_result, stop_after_attempt, wait_exponential
 from .dataworkz_api import DataworkzAPI
-from continuous_eval.metrics.retrieval import (
-    PrecisionRecallF1,
-    RankedRetrievalMetrics,
-    ContextPrecision,
-)
-from continuous_eval.metrics.generation.text import (
-    DeterministicAnswerCorrectness,
-    DeterministicFaithfulness,
-)
-from continuous_eval.metrics.generation.text.semantic import (
-    DebertaAnswerScores,
-    BertAnswerSimilarity,
-    BertAnswerRelevance,
-)
+from .matching_strategy import CachedRougeChunkMatch
+from .rate_limiter import TokenBucketRateLimiter
+from .retrieval_metrics import retrieval_scores
+from .llm_metrics import BatchContextPrecision
+from .semantic_cache import SemanticCache
+from continuous_eval.metrics.retrieval import ContextPrecision
+
+# the answer metrics import torch and transformers, they are imported on first use so
+# clients that only query the API, like get_dtwz_details.py, start without them
 
 # TODO: Add support for other providers of LLMs, like groq
 import logging
 
 logger = logging.getLogger()
 
+# answer requests that get no response are retried up to RETRIES times, backing off
+# exponentially from 1s up to MAX_RETRY_DELAY seconds
+RETRIES = 15
+MAX_RETRY_DELAY = 30.0
+
+
+def _log_retry(retry_state):
+    logger.debug(f"Retrying in {retry_state.next_action.sleep}s...")
+
+
+def _give_up(retry_state):
+    logger.error(
+        f"Failed to get a response after {retry_state.attempt_number} attempts."
+    )
+    return None
+
+
+def _context_columns(context: list[dict] | dict[str, list]) -> dict[str, list]:
+    """
+    Returns the context of an answer as one list per field ("data", "title",
+    "score", ...) instead of one dictionary per retrieved context, so the metrics
+    take the retrieved texts as they are. Contexts already in columns, like the ones
+    cached by this function, are returned unchanged
+    """
+    if isinstance(context, dict):
+        return context
+    fields = dict.fromkeys(key for ctx in context for key in ctx)
+    return {field: [ctx.get(field) for ctx in context] for field in fields}
+
 
 class AIDtwz:
     """
@@ -27,21 +55,30 @@ class AIDtwz:
 
     Attributes:
         dtwz_client (DataworkzAPI): Instance of DataworkzAPI for making requests.
+        rate_limiter (TokenBucketRateLimiter): Throttles answer and search requests to the Dataworkz API.
+        semantic_cache (SemanticCache): Answers near duplicate questions without a request, disabled when None.
+        matching_strategy (CachedRougeChunkMatch): Chunk matching shared by the retrieval metrics.
+        deberta_metric, bert_similarity_metric, bert_relevance_metric: Semantic answer metrics, loaded on first use.
+            Their models are shared by every client in the process.
+        onnx_scorers (bool): Whether the semantic metrics run int8 quantized models with ONNX Runtime.
+        context_precision_metric: LLM based context precision, created on first use.
+        batch_mode (bool): Whether the LLM based context precision is scored with the Batch API. The scores of
+            score_retrieval are then resolved by flush_context_precision.
         system_id (str): ID of the current system being used.
         llm_provider_id (str): ID of the LLM provider in use.
         answer (str): The most recent answer retrieved.
-        context (str): The most recent context retrieved.
+        context (dict[str, list]): The most recent context retrieved, one list per field.
         response (dict): The most recent response from a request to the Dataworkz API.
         llm_eval (bool): Whether to evaluate using LLM-based methods or not.
-        retries (int): Number of times left to retry before failing. Default is 15.
-        retry (bool): Whether to continue retrying after failure. Default is True.
+        max_concurrency (int): Maximum number of queries fetched at a time by batch_get_chunks.
 
     Methods:
-        __init__(self, llm_eval=False)
+        __init__(self, answer_metrics=False, additional_metrics=False, max_concurrency=8, max_requests_per_second=2, semantic_cache=None, onnx_scorers=False, batch_mode=False)
             Initializes the DTWZClient with a DataworkzAPI instance and optionally whether to evaluate using LLM-based methods.
+            The client must be entered with `async with` before issuing answer or search requests.
 
-        find_key_by_value(self, json_obj, target_value, current_path="")
-            Recursively searches for the full path of the key in a nested JSON object where the value matches the target_value.
+        find_key_by_value(self, json_obj, target_value)
+            Searches a nested JSON object for the dictionary with a value matching the target_value and returns its input data.
 
         set_system_id(self, system_id: str)
             Sets the ID of the Q&A system to be used.
@@ -58,66 +95,177 @@ class AIDtwz:
         get_llm_provider_details(self)
             Fetches details about the current LLM provider from Dataworkz.
 
-        get_chunks(self, query: str)
-            Gets chunks of text relevant to a given query from Dataworkz.
+        async aget_chunks(self, query: str, system_id: str | None = None)
+            Gets the answer, context and chunks of text relevant to a given query from Dataworkz.
+
+        async batch_get_chunks(self, queries: list[str], system_id: str | None = None)
+            Gets the answer, context and chunks of text of many queries concurrently.
 
         get_answer(self)
-            Returns the most recent answer retrieved by get_chunks method.
+            Returns the most recent answer retrieved by aget_chunks method.
+
+        get_context_table(self)
+            Returns the most recent context retrieved by aget_chunks method as a pyarrow Table.
 
-        get_search(self, query: str)
+        async get_search(self, query: str, system_id: str | None = None)
             Performs a search on Dataworkz's Q&A system using the given query.
 
         async score_retrieval(self, query: str, gt_answer: str, chunks: list[dict])
             Computes retrieval-based metrics for the retrieved context.
+            In batch mode, returns a future of them that resolves when flush_context_precision is called.
+
+        async flush_context_precision(self)
+            Scores the context precision queued by score_retrieval in batch mode with the Batch API.
 
-        score_system(self, query: str, gt_answer: str)
-            Computes various system-based metrics such as answer correctness, faithfulness etc., for the most recent query and ground truth answer.
+        async score_system(self, query: str, gt_answer: str, answer: str, context: dict[str, list])
+            Computes various system-based metrics such as answer correctness, faithfulness etc., for the given answer and ground truth answer.
+
+        async score_system_batch(self, rows: list[dict])
+            Computes the score_system metrics for a batch of answers, running the semantic metrics once on the whole batch.
     """
 
     dtwz_client: DataworkzAPI
+    rate_limiter: TokenBucketRateLimiter
+    semantic_cache: SemanticCache | None
+    matching_strategy: CachedRougeChunkMatch
     system_id: str
     llm_provider_id: str
     answer: str
-    context: str
+    context: dict[str, list]
     response: dict
     answer_metrics: bool
     additional_metrics: bool
-    retries: int = 15
-    retry: bool = True
+    onnx_scorers: bool
+    batch_mode: bool
+    max_concurrency: int
 
-    def __init__(self, answer_metrics=False, additional_metrics=False):
-        self.dtwz_client = DataworkzAPI()
+    def __init__(
+        self,
+        answer_metrics=False,
+        additional_metrics=False,
+        max_concurrency=8,
+        max_requests_per_second=2,
+        semantic_cache: SemanticCache | None = None,
+        onnx_scorers: bool = False,
+        batch_mode: bool = False,
+    ):
+        self.max_concurrency = max_concurrency
+        self.dtwz_client = DataworkzAPI(max_concurrency=max_concurrency)
+        self.rate_limiter = TokenBucketRateLimiter(
+            max_tokens=max_requests_per_second, refill_interval=1.0
+        )
+        # the requests in flight, by (system, LLM provider, question)
+        self._in_flight: dict[tuple[str, str, str], asyncio.Task] = {}
+        self.semantic_cache = semantic_cache
+        # shared across metrics and systems, so chunk pairs are only scored once
+        self.matching_strategy = CachedRougeChunkMatch()
         self.answer_metrics = answer_metrics
         self.additional_metrics = additional_metrics
+        self.onnx_scorers = onnx_scorers
+        self.batch_mode = batch_mode
+        # taken by the semantic metric groups on the PyTorch CPU path, see _scorer_turn
+        self._cpu_scorer_lock = threading.Lock()
+        # (datum, retrieval metrics, future) of the context precision left to score
+        self._context_precision_batch: list[tuple[dict, dict, asyncio.Future]] = []
         return
 
-    def find_key_by_value(self, json_obj, target_value, current_path=""):
+    async def __aenter__(self):
+        await self.dtwz_client.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.dtwz_client.__aexit__(exc_type, exc_value, traceback)
+        if self.semantic_cache is not None:
+            # the responses are already paid for, a cache that cannot be written must
+            # not lose the results of the run
+            try:
+                self.semantic_cache.save()
+            except OSError as e:
+                logger.error(f"ERROR: could not save the semantic cache: {e}")
+
+    def find_key_by_value(self, json_obj, target_value):
         """
-        Recursively searches for the full path of the key in a nested JSON
-        object where the value matches the target_value.
+        Searches depth first, in document order, for the dictionary in a nested JSON
+        object that has a value matching the target_value. The values of a dictionary
+        are checked in order and each child is searched where it appears, like the
+        recursive search this replaces. A matching dictionary with an empty input is
+        skipped with the rest of its values, and the search goes on after it.
 
         :param json_obj: The JSON object (can be a dictionary or list).
         :param target_value: The value to search for.
-        :param current_path: The current nested path being explored.
-        :return: The full path of the key as a string, or None if not found.
+        :return: The "Input" data of the matching dictionary, or None if not found.
         """
-        if isinstance(json_obj, dict):
-            for key, value in json_obj.items():
-                new_path = f"{current_path}.{key}" if current_path else key
-                if value == target_value:
-                    return json_obj["data"]["Input"]
-                elif isinstance(value, (dict, list)):
-                    found = self.find_key_by_value(value, target_value, new_path)
-                    if found:
+
+        def children(node):
+            return iter(node.values() if isinstance(node, dict) else node)
+
+        if not isinstance(json_obj, (dict, list)):
+            return None
+        # each frame holds a node and the iterator of the values left to visit
+        stack = [(json_obj, children(json_obj))]
+        while stack:
+            node, values = stack[-1]
+            for value in values:
+                if isinstance(node, dict) and value == target_value:
+                    found = node["data"]["Input"]
+                    if found or len(stack) == 1:
                         return found
-        elif isinstance(json_obj, list):
-            for index, item in enumerate(json_obj):
-                new_path = f"{current_path}[{index}]"
-                found = self.find_key_by_value(item, target_value, new_path)
-                if found:
-                    return found
+                    stack.pop()
+                    break
+                if isinstance(value, (dict, list)):
+                    stack.append((value, children(value)))
+                    break
+            else:
+                stack.pop()
         return None
 
+    def _onnx_session_threads(self) -> int:
+        from .onnx_scorers import session_threads
+
+        # the BERT session only runs, next to the DeBERTa one, for the additional metrics
+        return session_threads(2 if self.additional_metrics else 1)
+
+    @cached_property
+    def deberta_metric(self):
+        from .semantic_metrics import BatchDebertaAnswerScores, get_deberta_scorer
+
+        if self.onnx_scorers:
+            from .onnx_scorers import get_onnx_deberta_scorer
+
+            return BatchDebertaAnswerScores(
+                get_onnx_deberta_scorer(self._onnx_session_threads())
+            )
+        return BatchDebertaAnswerScores(get_deberta_scorer())
+
+    @cached_property
+    def bert_scorer(self):
+        # shared by the similarity and relevance metrics, so BERT is only loaded once
+        if self.onnx_scorers:
+            from .onnx_scorers import get_onnx_bert_scorer
+
+            return get_onnx_bert_scorer(self._onnx_session_threads())
+        from .semantic_metrics import get_bert_scorer
+
+        return get_bert_scorer()
+
+    @cached_property
+    def context_precision_metric(self):
+        if self.batch_mode:
+            return BatchContextPrecision()
+        return ContextPrecision()
+
+    @cached_property
+    def bert_similarity_metric(self):
+        from .semantic_metrics import BatchBertAnswerSimilarity
+
+        return BatchBertAnswerSimilarity(self.bert_scorer)
+
+    @cached_property
+    def bert_relevance_metric(self):
+        from .semantic_metrics import BatchBertAnswerRelevance
+
+        return BatchBertAnswerRelevance(self.bert_scorer)
+
     def set_system_id(self, system_id: str):
         self.system_id = system_id
         return
@@ -135,79 +283,274 @@ class AIDtwz:
     def get_llm_provider_details(self):
         return self.dtwz_client.get_llm_providers(self.system_id)
 
-    def get_chunks(self, query: str):
-        while self.retry:
-            self.response = self.dtwz_client.get_answer(
-                self.system_id,
-                query,
-                self.llm_provider_id,
-                properties="include_probe=true",
-            )
-            if self.response is not None:
-                self.answer = self.response["answer"]
-                self.context = self.response["context"]
-                return self.find_key_by_value(
-                    self.response["probe"], "MERGE_NEIGHBOURING_CONTEXT"
+    @retry(
+        stop=stop_after_attempt(RETRIES + 1),
+        wait=wait_exponential(multiplier=1, min=1, max=MAX_RETRY_DELAY),
+        retry=retry_if_result(lambda response: response is None),
+        before_sleep=_log_retry,
+        retry_error_callback=_give_up,
+    )
+    async def _fetch(self, system_id: str, query: str):
+        # each call retries on its own, a client never runs out of retries
+        await self.rate_limiter.acquire()
+        return await self.dtwz_client.get_answer(
+            system_id,
+            query,
+            self.llm_provider_id,
+            properties="include_probe=true",
+        )
+
+    async def _get_response(self, system_id: str, query: str):
+        # near duplicate questions are answered from the semantic cache, if enabled.
+        # The query is embedded once for the lookup and the insert after a miss, both
+        # run in worker threads so the encoder does not block the other fetches
+        if self.semantic_cache is None:
+            return await self._fetch(system_id, query)
+        embedding = await asyncio.to_thread(self.semantic_cache.embed, query)
+        response = await asyncio.to_thread(
+            self.semantic_cache.get, system_id, query, embedding, self.llm_provider_id
+        )
+        if response is None:
+            response = await self._fetch(system_id, query)
+            if response is not None:
+                await asyncio.to_thread(
+                    self.semantic_cache.put,
+                    system_id,
+                    query,
+                    response,
+                    embedding,
+                    self.llm_provider_id,
                 )
-            if self.retries == 0:
-                logger.error(f"Failed to get a response after 10 attempts.")
-                return None
-            logger.debug("Retrying...")
-            time.sleep(10)
-            self.retries -= 1
+        return response
+
+    async def aget_chunks(self, query: str, system_id: str | None = None):
+        """
+        Fetches the answer for the query from the QNA system identified by system_id,
+        defaulting to the current system. Failed requests are retried up to RETRIES
+        times, backing off exponentially from 1s up to MAX_RETRY_DELAY seconds.
+        Safe to call concurrently for different systems.
+
+        :return: A tuple of (answer, context, merge input chunks), or None if no response
+            could be fetched.
+        """
+        system_id = system_id or self.system_id
+        # concurrent calls for the same question wait for the request of the first
+        # one. Only the requests in flight are kept, so the responses of the run are
+        # not held in memory, repeated questions are answered by the semantic cache
+        key = (system_id, self.llm_provider_id, query)
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._get_response(system_id, query))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # shielded, so a cancelled caller does not cancel the request of the others
+        response = await asyncio.shield(task)
+        if response is None:
+            return None
+        # converted in place, so the cached responses are only converted once
+        response["context"] = _context_columns(response["context"])
+        self.response = response
+        self.answer = response["answer"]
+        self.context = response["context"]
+        return (
+            response["answer"],
+            response["context"],
+            self.find_key_by_value(response["probe"], "MERGE_NEIGHBOURING_CONTEXT"),
+        )
+
+    async def batch_get_chunks(self, queries: list[str], system_id: str | None = None):
+        """
+        Fetches the answers for many queries concurrently with aget_chunks, keeping at
+        most max_concurrency of them in progress at a time.
+
+        :return: The aget_chunks results, in the order of queries.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def bounded_get_chunks(query: str):
+            async with semaphore:
+                return await self.aget_chunks(query, system_id)
+
+        return await asyncio.gather(*(bounded_get_chunks(q) for q in queries))
 
     def get_answer(self):
         return self.answer
 
-    def get_search(self, query: str):
-        self.response = self.dtwz_client.get_search(self.system_id, query)
+    def get_context_table(self):
+        """
+        Returns the most recent context as a pyarrow Table with one column per field,
+        so its numeric columns, like the scores, can be read as arrays with to_numpy.
+        The scoring methods take the "data" column as a list and do not need the table
+        """
+        import pyarrow as pa
+
+        return pa.table(self.context)
+
+    async def get_search(self, query: str, system_id: str | None = None):
+        await self.rate_limiter.acquire()
+        self.response = await self.dtwz_client.get_search(
+            system_id or self.system_id, query
+        )
         return self.response
 
     async def score_retrieval(self, query: str, gt_answer: str, chunks: list[dict]):
-        retrieved_chunks = []
-        for chunk in chunks:
-            retrieved_chunks.append(chunk["Content"])
+        retrieved_chunks = [chunk["Content"] for chunk in chunks]
         datum = {
             "question": query,
             "retrieved_context": retrieved_chunks,
             "ground_truth_context": gt_answer,
         }
-        metrics = PrecisionRecallF1()
-        ranked_metrics = RankedRetrievalMetrics()
-        overall_metrics = (metrics(**datum)) | (ranked_metrics(**datum))
+        # the PrecisionRecallF1 and RankedRetrievalMetrics scores
+        overall_metrics = retrieval_scores(
+            self.matching_strategy, retrieved_chunks, gt_answer
+        )
         # Adding context precision to the metrics computed via LLM based method.
         # Needs the OpenAI API key set as an environ variable
+        if self.answer_metrics and self.batch_mode:
+            # the LLM metrics are added once the shared batch is flushed
+            future = asyncio.get_running_loop().create_future()
+            self._context_precision_batch.append((datum, overall_metrics, future))
+            return future
         if self.answer_metrics:
-            llm_context_precision = ContextPrecision()
-            llm_context_precision_metrics = llm_context_precision(**datum)
+            # the metric makes blocking OpenAI requests, keep them off the event loop
+            llm_context_precision_metrics = await asyncio.to_thread(
+                self.context_precision_metric, **datum
+            )
             # Renaming LLM metrics to reflect they are from the LLM based method.
-            for key in llm_context_precision_metrics.keys():
-                new_key = f"LLM_{key}"
-                overall_metrics[new_key] = llm_context_precision_metrics[key]
+            overall_metrics.update(
+                (f"LLM_{key}", value)
+                for key, value in llm_context_precision_metrics.items()
+            )
         return overall_metrics
 
+    async def flush_context_precision(self):
+        """
+        Scores the context precision of every datum queued by score_retrieval in one
+        Batch API run, and resolves their futures with the retrieval metrics. If the
+        batch cannot be scored, the LLM metrics of every datum are nan, so the
+        retrieval metrics of the run are not lost
+        """
+        pending, self._context_precision_batch = self._context_precision_batch, []
+        if not pending:
+            return
+        logger.debug(f"INFO: scoring the context precision of {len(pending)} queries")
+        try:
+            # waiting for the batch blocks for minutes to hours, keep it off the event loop
+            scores = await asyncio.to_thread(
+                self.context_precision_metric.compute_batch,
+                [datum for datum, _, _ in pending],
+            )
+        except Exception as e:
+            logger.error(f"ERROR: could not score the context precision batch: {e!r}")
+            scores = [self.context_precision_metric._aggregate([])] * len(pending)
+        for (_, overall_metrics, future), score in zip(pending, scores, strict=True):
+            overall_metrics.update(
+                (f"LLM_{key}", value) for key, value in score.items()
+            )
+            future.set_result(overall_metrics)
+
     # placeholder to compute deterministic metrics for the final answer
-    def score_system(self, query: str, gt_answer: str):
-        retrieved_context = []
-        for ctx in self.context:
-            retrieved_context.append(ctx["data"])
-        datum = {
-            "question": query,
-            "answer": self.answer,
-            "ground_truth_answers": gt_answer,
-            "ground_truth_context": gt_answer,
-            "retrieved_context": retrieved_context,
-        }
-        deberta_metric = DebertaAnswerScores()
-        score = deberta_metric(**datum)
+    async def score_system(
+        self, query: str, gt_answer: str, answer: str, context: dict[str, list]
+    ):
+        rows = [
+            {
+                "question": query,
+                "gt_answer": gt_answer,
+                "answer": answer,
+                "context": context,
+            }
+        ]
+        return (await self.score_system_batch(rows))[0]
+
+    def _deterministic_scores(self, data: list[dict]) -> list[dict]:
+        from continuous_eval.metrics.generation.text import (
+            DeterministicAnswerCorrectness,
+            DeterministicFaithfulness,
+        )
+
+        correctness_metric = DeterministicAnswerCorrectness()
+        faithfulness_metric = DeterministicFaithfulness()
+        return [
+            correctness_metric(**datum) | faithfulness_metric(**datum) for datum in data
+        ]
+
+    def _scorer_turn(self):
+        """
+        Returns the lock a semantic metric group holds while it runs. On the PyTorch
+        CPU path each group uses every core, so the groups take turns instead of
+        oversubscribing the CPU. The ONNX sessions split the cores between them and
+        GPU runs do not compete for them, their groups run at the same time
+        """
+        if self.onnx_scorers:
+            return contextlib.nullcontext()
+        from .semantic_metrics import DEVICE
+
+        if DEVICE == "cpu":
+            return self._cpu_scorer_lock
+        return contextlib.nullcontext()
+
+    def _deberta_scores(self, answers: list[str], gt_answers: list[str]) -> list[dict]:
+        # the metric is created here, so its model loads in the worker thread
+        with self._scorer_turn():
+            return self.deberta_metric.batch(
+                answer=answers, ground_truth_answers=gt_answers
+            )
+
+    def _bert_scores(
+        self, questions: list[str], answers: list[str], gt_answers: list[str]
+    ) -> list[dict]:
+        # run one after the other, they share the BERT scorer and its embedding cache
+        with self._scorer_turn():
+            similarity_scores = self.bert_similarity_metric.batch(
+                answer=answers, ground_truth_answers=gt_answers
+            )
+            relevance_scores = self.bert_relevance_metric.batch(
+                answer=answers, question=questions
+            )
+        return [
+            similarity | relevance
+            for similarity, relevance in zip(
+                similarity_scores, relevance_scores, strict=True
+            )
+        ]
+
+    async def score_system_batch(self, rows: list[dict]):
+        """
+        Computes the score_system metrics for many answers at once. Each row holds
+        the "question", "gt_answer", "answer" and "context" of one answer. The
+        semantic metrics score the whole batch in one call, so their models are
+        loaded once and run batched forward passes instead of one per answer.
+
+        :return: The scores of each row, in the order of rows.
+        """
+        if not rows:
+            return []
+        questions = [row["question"] for row in rows]
+        answers = [row["answer"] for row in rows]
+        gt_answers = [row["gt_answer"] for row in rows]
+        # the metrics are independent, each group runs in its own thread so the
+        # slowest one sets the latency instead of the sum of them. On the PyTorch CPU
+        # path the DeBERTa and BERT groups take turns, see _scorer_turn
+        tasks = [asyncio.to_thread(self._deberta_scores, answers, gt_answers)]
         if self.additional_metrics:
-            correctness_metric = DeterministicAnswerCorrectness()
-            score |= correctness_metric(**datum)
-            faithfulness_metric = DeterministicFaithfulness()
-            score |= faithfulness_metric(**datum)
-            bert_similarity_metrics = BertAnswerSimilarity()
-            score |= bert_similarity_metrics(**datum)
-            datum = {"question": query, "answer": self.answer}
-            bert_relevance_metrics = BertAnswerRelevance()
-            score |= bert_relevance_metrics(**datum)
-        return score
+            data = [
+                {
+                    "question": row["question"],
+                    "answer": row["answer"],
+                    "ground_truth_answers": row["gt_answer"],
+                    "ground_truth_context": row["gt_answer"],
+                    "retrieved_context": row["context"].get("data", []),
+                }
+                for row in rows
+            ]
+            tasks.append(asyncio.to_thread(self._deterministic_scores, data))
+            tasks.append(
+                asyncio.to_thread(self._bert_scores, questions, answers, gt_answers)
+            )
+        metric_scores = await asyncio.gather(*tasks)
+        # the scores of a row are built in a single pass over the scores of each metric
+        return [
+            {key: value for score in scores for key, value in score.items()}
+            for scores in zip(*metric_scores, strict=True)
+        ]
@@ -1,9 +1,16 @@
+import asyncio
+import json
 import os
-from typing import Dict, Optional
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Dict, List, Optional
 
 from continuous_eval.llms.base import LLMInterface, LLMInterfaceFactory
+from tenacity import retry, stop_after_attempt, wait_exponential
 
 try:
+    import httpx
+    from openai import AsyncOpenAI as _AsyncOpenAI
     from openai import OpenAI as _OpenAI
 
     GROQ_OPENAI_AVAILABLE = True
@@ -61,6 +68,14 @@ class GroqOpenAI(LLMInterface):
             api_key=api_key or os.getenv("GROQ_API_KEY"),
             base_url=endpoint,
         )
+        # one pooled connection per concurrent request, kept alive between requests
+        self.aclient = _AsyncOpenAI(
+            api_key=api_key or os.getenv("GROQ_API_KEY"),
+            base_url=endpoint,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=100)
+            ),
+        )
         self.defaults = {
             "seed": 0,
             "temperature": 0.001,
@@ -71,19 +86,143 @@ class GroqOpenAI(LLMInterface):
             "model": model or "llama-3.3-70b-versatile",
         }
         self.defaults.update(kwargs)
+        # read only view of the defaults, the requests are built on top of it
+        self._base_kwargs = MappingProxyType(self.defaults)
+        # metric prompts repeat the same ground truths, identical requests are only
+        # sent once
+        self._cached_complete = lru_cache(maxsize=2048)(self._complete)
 
-    def run(self, prompt: Dict[str, str], temperature: float = 0) -> str:
-        kwargs = self.defaults.copy()
-        kwargs["temperature"] = temperature
-        response = self.client.chat.completions.create(
-            messages=[
-                {"role": "system", "content": prompt["system_prompt"]},
-                {"role": "user", "content": prompt["user_prompt"]},
+    def _request(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float,
+        response_format: Optional[Dict] = None,
+    ) -> Dict:
+        request = {
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt},
             ],
-            **kwargs,
+            **self._base_kwargs,
+            "temperature": temperature,
+        }
+        if response_format is not None:
+            request["response_format"] = response_format
+        return request
+
+    def _complete(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        temperature: float,
+        response_format: Optional[str],
+    ) -> str:
+        response = self.client.chat.completions.create(
+            **self._request(
+                system_prompt,
+                user_prompt,
+                temperature,
+                json.loads(response_format) if response_format else None,
+            )
+        )
+        return response.choices[0].message.content
+
+    def run(
+        self,
+        prompt: Dict[str, str],
+        temperature: float = 0,
+        response_format: Optional[Dict] = None,
+    ) -> str:
+        """
+        Returns the answer to the prompt. Pass response_format={"type": "json_object"}
+        for prompts that ask for a JSON answer
+        """
+        # keyed by the JSON of the response format, dictionaries are not hashable
+        return self._cached_complete(
+            prompt["system_prompt"],
+            prompt["user_prompt"],
+            temperature,
+            json.dumps(response_format, sort_keys=True) if response_format else None,
+        )
+
+    async def arun(
+        self,
+        prompt: Dict[str, str],
+        temperature: float = 0,
+        response_format: Optional[Dict] = None,
+    ) -> str:
+        response = await self.aclient.chat.completions.create(
+            **self._request(
+                prompt["system_prompt"],
+                prompt["user_prompt"],
+                temperature,
+                response_format,
+            )
         )
         return response.choices[0].message.content
 
+    def submit_batch(
+        self, prompts: List[Dict[str, str]], temperature: float = 0
+    ) -> str:
+        """
+        Submits the prompts to the Batch API, which runs them within 24 hours at a lower
+        cost than run.
+
+        :return: The ID of the batch, to pass to poll_batch.
+        """
+        bodies = [
+            self._request(prompt["system_prompt"], prompt["user_prompt"], temperature)
+            for prompt in prompts
+        ]
+        from .llm_metrics import create_batch
+
+        return create_batch(self.client, bodies)
+
+    def poll_batch(self, batch_id: str) -> List[Optional[str]]:
+        """
+        Waits for the batch to complete.
+
+        :return: The answers to the prompts in order, None for the prompts that failed.
+        """
+        from .llm_metrics import wait_for_batch
+
+        return [
+            body["choices"][0]["message"]["content"] if body is not None else None
+            for body in wait_for_batch(self.client, batch_id)
+        ]
+
+
+class AsyncBatchRunner:
+    """
+    Runs prompts concurrently against an LLM with an async arun method, such as
+    GroqOpenAI. At most max_concurrency requests are in flight at a time, and a
+    failed request is retried with exponential backoff.
+
+    Example:
+    ```
+    runner = AsyncBatchRunner(GroqOpenAI(), max_concurrency=32)
+    answers = await runner.run(prompts)
+    ```
+    """
+
+    def __init__(self, llm, max_concurrency: int = 32, temperature: float = 0):
+        self.llm = llm
+        self.temperature = temperature
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    # the backoff sleeps happen outside the semaphore, so they do not hold a slot
+    @retry(wait=wait_exponential(max=30), stop=stop_after_attempt(5), reraise=True)
+    async def _one(self, prompt: Dict[str, str]) -> str:
+        async with self.semaphore:
+            return await self.llm.arun(prompt, self.temperature)
+
+    async def run(self, prompts: List[Dict[str, str]]) -> List[str]:
+        """
+        Returns the answers to the prompts, in the same order
+        """
+        return await asyncio.gather(*(self._one(prompt) for prompt in prompts))
+
 
 class GroqOpenAIFactory(LLMInterfaceFactory):
     def __init__(
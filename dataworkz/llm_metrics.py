@@ -0,0 +1,224 @@
+"""
+Package that incorporates the LLM judged metrics scored with the OpenAI Batch API. A batch
+costs about half as much as the same requests sent one at a time, and completes within
+24 hours
+"""
+
+import io
+import json
+import math
+import time
+
+from continuous_eval.metrics.retrieval import ContextPrecision
+
+import logging
+
+logger = logging.getLogger()
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+
+def create_batch(client, bodies: list[dict]) -> str:
+    """
+    Uploads the chat completion request bodies as a JSONL file and creates a batch of
+    them with an OpenAI compatible client. The custom_id of a request is its index.
+
+    :return: The ID of the batch.
+    """
+    lines = (
+        json.dumps(
+            {"custom_id": str(i), "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+        )
+        for i, body in enumerate(bodies)
+    )
+    batch_file = client.files.create(
+        file=("batch.jsonl", io.BytesIO("\n".join(lines).encode())), purpose="batch"
+    )
+    batch = client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window="24h",
+    )
+    logger.debug(f"INFO: created batch {batch.id} of {len(bodies)} requests")
+    return batch.id
+
+
+def wait_for_batch(client, batch_id: str, max_delay: float = 600.0) -> list[dict]:
+    """
+    Polls the batch with exponential backoff until it completes. An expired or
+    cancelled batch still returns the requests it completed, a failed batch raises a
+    RuntimeError.
+
+    :return: The response bodies in the order of the requests, None for the requests that failed.
+    """
+    attempt = 0
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if batch.status == "completed":
+            break
+        if batch.status in ("expired", "cancelled"):
+            logger.error(
+                f"ERROR: batch {batch_id} {batch.status}, keeping its "
+                f"{batch.request_counts.completed} completed requests"
+            )
+            break
+        if batch.status == "failed":
+            raise RuntimeError(f"ERROR: batch {batch_id} failed")
+        time.sleep(min(max_delay, 2**attempt))
+        attempt += 1
+    responses = [None] * batch.request_counts.total
+    if batch.output_file_id is not None:
+        for line in client.files.content(batch.output_file_id).text.splitlines():
+            output = json.loads(line)
+            if output["response"] and output["response"]["status_code"] == 200:
+                responses[int(output["custom_id"])] = output["response"]["body"]
+    if batch.request_counts.failed:
+        logger.error(
+            f"ERROR: {batch.request_counts.failed} requests of batch {batch_id} failed"
+        )
+    return responses
+
+
+class BatchContextPrecision(ContextPrecision):
+    """
+    ContextPrecision that scores many data at once, with one Batch API request per
+    retrieved context. The requests and their scoring are the same as ContextPrecision
+
+    Attributes:
+        max_batch_size (int): Maximum number of requests in one batch. Default is 50000, the Batch API limit.
+    """
+
+    def __init__(self, *args, max_batch_size: int = 50_000, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_batch_size = max_batch_size
+
+    def _body(self, **kwargs) -> dict:
+        """
+        Returns the chat completion request of ProbabilisticMetric._process
+        """
+        msgs = self.prompt.render(**kwargs)
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": msgs["system_prompt"]},
+                {"role": "user", "content": msgs["user_prompt"]},
+            ],
+            "temperature": self.temperature,
+            "logprobs": True,
+            "top_logprobs": len(self.prompt.response_format.values()),
+            "response_format": self._response_format(),
+        }
+
+    def _response_format(self) -> dict:
+        """
+        Returns the strict JSON schema response format of the Evaluation the prompt
+        answers with, the one the client would send for _response_format_type
+        """
+        schema = self._response_format_type.model_json_schema()
+        schema["additionalProperties"] = False
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": self._response_format_type.__name__,
+                "schema": schema,
+                "strict": True,
+            },
+        }
+
+    def _yes_probability(self, body: dict | None) -> float:
+        """
+        Returns the normalized probability of the "yes" token of the response, the way
+        ProbabilisticMetric._process does, or nan if the request failed or its answer is
+        not an Evaluation
+        """
+        if body is None:
+            return math.nan
+        choice = body["choices"][0]
+        try:
+            score = str(json.loads(choice["message"]["content"]).get("score", ""))
+        except (json.JSONDecodeError, AttributeError, TypeError):
+            logger.error(f"ERROR: invalid evaluation {choice['message']['content']!r}")
+            return math.nan
+        tokens = choice["logprobs"]["content"]
+        token = next((t for t in tokens if t["token"].strip() == score), None)
+        if token is None:
+            return math.nan
+        logprobs = {str(cat): -math.inf for cat in self.prompt.response_format.values()}
+        for logprob in token["top_logprobs"]:
+            name = logprob["token"].strip()
+            if name in logprobs:
+                logprobs[name] = max(logprobs[name], logprob["logprob"])
+        probs = {name: math.exp(lp) for name, lp in logprobs.items()}
+        total = sum(probs.values())
+        if total == 0:
+            # none of the categories is among the top logprobs of the score token
+            return math.nan
+        return probs["yes"] / total
+
+    def _aggregate(self, scores: list[float]) -> dict:
+        """
+        Returns the ContextPrecision metrics of the "yes" probabilities of the contexts
+        """
+        if not scores:
+            return {
+                "percentage_relevant": math.nan,
+                "context_precision": math.nan,
+                "context_mean_average_precision": math.nan,
+            }
+        relevant_count = 0
+        mAP = 0
+        for i, score in enumerate(scores):
+            if score > 0.5:
+                relevant_count += 1
+                mAP += relevant_count / (i + 1)  # Precision at this rank
+        if relevant_count > 0:
+            mAP /= relevant_count  # Average precision
+        ret = {
+            "percentage_relevant": relevant_count / len(scores),
+            "context_precision": sum(scores) / len(scores),
+            "context_mean_average_precision": mAP,
+        }
+        if self.log_relevance_by_context:
+            ret["context_relevance_by_context"] = scores
+        return ret
+
+    def compute_batch(self, data: list[dict]) -> list[dict]:
+        """
+        Scores the question and retrieved_context of every datum in as few batches as
+        possible, blocking until all of them complete
+
+        :return: The ContextPrecision metrics of each datum, in order.
+        """
+        bodies = []
+        owners = []
+        for i, datum in enumerate(data):
+            for context in datum["retrieved_context"]:
+                bodies.append(
+                    self._body(
+                        question=datum["question"],
+                        context=context,
+                        use_few_shot=self.use_few_shot,
+                    )
+                )
+                owners.append(i)
+        # submit every batch before waiting, so they run at the same time
+        batches = [
+            (create_batch(self._client, batch), len(batch))
+            for batch in (
+                bodies[i : i + self.max_batch_size]
+                for i in range(0, len(bodies), self.max_batch_size)
+            )
+        ]
+        responses = []
+        for batch_id, size in batches:
+            try:
+                batch_responses = wait_for_batch(self._client, batch_id)
+            except RuntimeError as e:
+                # the other batches are still scored, the contexts of this one are nan
+                logger.error(f"{e}, scoring its {size} contexts as nan")
+                batch_responses = [None] * size
+            responses.extend(batch_responses)
+        scores = [[] for _ in data]
+        for i, body in zip(owners, responses, strict=True):
+            scores[i].append(self._yes_probability(body))
+        return [self._aggregate(s) for s in scores]
@@ -0,0 +1,39 @@
+"""
+Package that incorporates the logging setup shared by the benchmark scripts. Records are
+handed to a queue and written to the log file by a background listener thread, so the
+event loop never blocks on file I/O
+"""
+
+import atexit
+import datetime as dt
+import logging
+import logging.handlers
+import queue
+
+# no colons in the timestamps of file names, they are not allowed on Windows or in S3 keys
+TIMESTAMP_FORMAT = "%Y-%m-%d_%H-%M-%S"
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+def init_logger(prefix: str) -> logging.Logger:
+    """
+    Configures the root logger to write DEBUG records to <prefix>_<timestamp>.log and
+    returns it. The log file is only created on the first call, later calls return the
+    already configured logger
+    """
+    global _listener
+    logger = logging.getLogger()
+    if _listener is not None:
+        return logger
+    log_file_name = f"{prefix}_{dt.datetime.now():{TIMESTAMP_FORMAT}}.log"
+    file_handler = logging.FileHandler(log_file_name, mode="w")
+    file_handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, file_handler)
+    _listener.start()
+    # flush the queued records to the file before the interpreter exits
+    atexit.register(_listener.stop)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(logging.DEBUG)
+    return logger
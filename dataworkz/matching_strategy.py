@@ -0,0 +1,116 @@
+"""
+Package that incorporates the matching strategies used to score the retrieved context
+"""
+
+from functools import lru_cache
+
+import numpy as np
+from continuous_eval.metrics.retrieval.matching_strategy import RougeChunkMatch
+
+
+@lru_cache(maxsize=8192)
+def _sentence_words(text: str) -> tuple[tuple[str, ...], ...]:
+    """
+    Splits a text into sentences of words the same way rouge.Rouge does
+    """
+    sentences = [" ".join(s.split()) for s in text.split(".") if len(s) > 0]
+    return tuple(tuple(s.split(" ")) for s in sentences)
+
+
+def _union_lcs_ids(x: np.ndarray, y: np.ndarray, starts: list[int]) -> set[int]:
+    """
+    Returns the union of the token ids of x on the longest common subsequence of x and
+    each hypothesis sentence. The sentences are concatenated in y, each one preceded
+    by a -1 separator at the positions in starts, so the LCS tables of all of them are
+    filled together as one table. The tables are walked back the same way rouge does,
+    so ties resolve to the same subsequence
+    """
+    eq = x[:, None] == y[None, :]
+    separator = y == -1
+    # offset every sentence above the maximum LCS length of the previous ones so the
+    # running maximum along a row does not carry over from one sentence to the next
+    offset = np.cumsum(separator) * (len(x) + 1)
+    table = np.zeros((len(x) + 1, len(y)), dtype=np.int32)
+    row = np.zeros(len(y), dtype=np.int32)
+    # table[i, j] = max(table[i - 1, j], table[i, j - 1], table[i - 1, j - 1] + eq),
+    # the dependency on table[i, j - 1] is a running maximum along the row
+    for i in range(len(x)):
+        np.maximum(table[i, 1:], table[i, :-1] + eq[i, 1:], out=row[1:])
+        row[separator] = 0
+        table[i + 1] = np.maximum.accumulate(row + offset) - offset
+    table = table.tolist()
+    eq = eq.tolist()
+    ids = set()
+    for start, end in zip(starts, starts[1:] + [len(y)]):
+        i, j = len(x), end - 1
+        while i > 0 and j > start:
+            if eq[i - 1][j]:
+                ids.add(int(x[i - 1]))
+                i -= 1
+                j -= 1
+            elif table[i - 1][j] > table[i][j - 1]:
+                i -= 1
+            else:
+                j -= 1
+    return ids
+
+
+def rouge_l_recall(hypothesis: str, reference: str) -> float:
+    """
+    Summary level ROUGE-L recall of the hypothesis against the reference, equal to the
+    "rouge-l" "r" score of rouge.Rouge. The words are mapped to integer ids so the LCS
+    tables are filled one numpy row at a time instead of one Python dict entry at a time
+    """
+    hyp_sentences = _sentence_words(hypothesis)
+    ref_sentences = _sentence_words(reference)
+    if not hyp_sentences or not ref_sentences:
+        raise ValueError("Collections must contain at least 1 sentence.")
+    vocab = {}
+    hyp_ids = []
+    starts = []
+    for s in hyp_sentences:
+        starts.append(len(hyp_ids))
+        hyp_ids.append(-1)
+        hyp_ids.extend(vocab.setdefault(w, len(vocab)) for w in s)
+    hyp_ids = np.array(hyp_ids, dtype=np.int32)
+    # union of the LCS words of every (reference, hypothesis) sentence pair
+    union = set()
+    for s in ref_sentences:
+        ref_ids = np.array([vocab.setdefault(w, len(vocab)) for w in s], dtype=np.int32)
+        union |= _union_lcs_ids(ref_ids, hyp_ids, starts)
+    return len(union) / len({w for s in ref_sentences for w in s})
+
+
+class CachedRougeChunkMatch(RougeChunkMatch):
+    """
+    RougeChunkMatch that memoizes the relevance of (retrieved, ground truth) pairs.
+    The precision/recall and ranked retrieval metrics compare the same pairs several
+    times for every query, and the ground truth of a question is compared against the
+    chunks of every system, so each pair is only scored once. Only the ROUGE-L recall
+    used for matching is computed, with rouge_l_recall
+    """
+
+    def __init__(self, *args, maxsize: int = 65536, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.maxsize = maxsize
+        self._is_relevant = lru_cache(maxsize=maxsize)(self._match)
+
+    def _match(self, retrieved_component, ground_truth_component):
+        try:
+            return (
+                rouge_l_recall(retrieved_component, ground_truth_component)
+                >= self.threshold
+            )
+        except Exception:
+            return False
+
+    def is_relevant(self, retrieved_component, ground_truth_component):
+        return self._is_relevant(retrieved_component, ground_truth_component)
+
+    def __getstate__(self):
+        return super().__getstate__() | {"maxsize": self.maxsize}
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        self.maxsize = state["maxsize"]
+        self._is_relevant = lru_cache(maxsize=self.maxsize)(self._match)
@@ -0,0 +1,223 @@
+"""
+Package that incorporates int8 quantized versions of the DeBERTa and BERT scorers, run
+with ONNX Runtime. The models are exported to ONNX and dynamically quantized on first
+use, the quantized models are kept in ONNX_DIR. They are meant for CPU runs, where int8
+kernels roughly double the throughput of the FP32 models
+"""
+
+import inspect
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+import numpy as np
+import onnxruntime as ort
+import torch
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from continuous_eval.metrics.base import Metric
+from transformers import (
+    AutoModelForSequenceClassification,
+    AutoTokenizer,
+    BertModel,
+    BertTokenizer,
+)
+
+from .semantic_metrics import BATCH_SIZE, MAX_LENGTH, BertScorer, shared_scorer
+
+import logging
+
+logger = logging.getLogger()
+
+ONNX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "dataworkz", "onnx")
+DEBERTA_MODEL = "cross-encoder/nli-deberta-v3-large"
+BERT_MODEL = "bert-base-uncased"
+
+
+def session_threads(sessions: int = 1) -> int:
+    """
+    Returns the intra-op threads of each of sessions ONNX Runtime sessions that run at
+    the same time, so together they use every core once
+    """
+    return max(1, (os.cpu_count() or 1) // sessions)
+
+
+def export_to_onnx(
+    model: torch.nn.Module, inputs: dict, output_names: list[str], path: str
+):
+    """
+    Exports the model to ONNX with dynamic batch and sequence axes, and writes its
+    int8 dynamically quantized version to path + ".int8". Both are written to
+    temporary files and moved in place once complete, so an interrupted export never
+    leaves a partial model that later runs would load
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        _export_to_onnx(model, inputs, output_names, tmp_path)
+        quantize_dynamic(tmp_path, tmp_path + ".int8", weight_type=QuantType.QInt8)
+        os.replace(tmp_path, path)
+        os.replace(tmp_path + ".int8", path + ".int8")
+    finally:
+        for leftover in (tmp_path, tmp_path + ".int8"):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+
+def _export_to_onnx(
+    model: torch.nn.Module, inputs: dict, output_names: list[str], path: str
+):
+    # the exporter passes the inputs in the order of the forward signature
+    input_names = [
+        n for n in inspect.signature(model.forward).parameters if n in inputs
+    ]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    with torch.no_grad():
+        outputs = model(**inputs)
+        for name in output_names:
+            dynamic_axes[name] = {0: "batch", 1: "sequence"}
+            if outputs[name].dim() < 3:
+                dynamic_axes[name] = {0: "batch"}
+        torch.onnx.export(
+            model,
+            ({name: inputs[name] for name in input_names},),
+            path,
+            input_names=input_names,
+            output_names=output_names,
+            dynamic_axes=dynamic_axes,
+            opset_version=17,
+        )
+
+
+def quantized_session(
+    name: str,
+    load_model: Callable[[], torch.nn.Module],
+    inputs: dict,
+    output_names: list[str],
+    threads: int,
+) -> ort.InferenceSession:
+    """
+    Returns an ONNX Runtime session of the int8 model name running on threads intra-op
+    threads, exporting and quantizing the model returned by load_model first if it is
+    not in ONNX_DIR yet
+    """
+    path = os.path.join(ONNX_DIR, name.replace("/", "--") + ".onnx")
+    if not os.path.exists(path + ".int8"):
+        logger.debug(f"INFO: exporting {name} to {path}")
+        export_to_onnx(load_model().eval(), inputs, output_names, path)
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = threads
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    providers = [
+        p
+        for p in ["CUDAExecutionProvider", "CPUExecutionProvider"]
+        if p in ort.get_available_providers()
+    ]
+    return ort.InferenceSession(path + ".int8", options, providers=providers)
+
+
+class OnnxDebertaScorer:
+    """
+    Quantized drop-in replacement of DebertaScorer, its session runs on threads
+    intra-op threads, all the cores by default
+    """
+
+    def __init__(self, batch_size: int = BATCH_SIZE, threads: int | None = None):
+        self.tokenizer = AutoTokenizer.from_pretrained(DEBERTA_MODEL, use_fast=False)
+        # the tokenizer is not safe to call from several threads at once
+        self.lock = threading.Lock()
+        self.batch_size = batch_size
+        sample = dict(self.tokenizer([("premise", "hypothesis")], return_tensors="pt"))
+        self.session = quantized_session(
+            DEBERTA_MODEL,
+            lambda: AutoModelForSequenceClassification.from_pretrained(DEBERTA_MODEL),
+            sample,
+            ["logits"],
+            threads or session_threads(),
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def __call__(self, sentence_pairs):
+        """
+        Returns the entailment logits for each (premise, hypothesis) pair
+        """
+        logits = []
+        for i in range(0, len(sentence_pairs), self.batch_size):
+            batch = sentence_pairs[i : i + self.batch_size]
+            with self.lock:
+                tokens = self.tokenizer(
+                    [premise for premise, _ in batch],
+                    [hypothesis for _, hypothesis in batch],
+                    padding=True,
+                    truncation=True,
+                    max_length=MAX_LENGTH,
+                    return_tensors="np",
+                )
+            feed = {name: tokens[name].astype(np.int64) for name in self.input_names}
+            logits.append(self.session.run(["logits"], feed)[0])
+        return np.concatenate(logits)
+
+
+class OnnxBertScorer(BertScorer):
+    """
+    Quantized drop-in replacement of BertScorer, the embeddings are cached the same way.
+    Its session runs on threads intra-op threads, all the cores by default
+    """
+
+    def __init__(
+        self,
+        batch_size: int = BATCH_SIZE,
+        cache_size: int = 4096,
+        threads: int | None = None,
+    ):
+        # BertSimilarity.__init__ would load the PyTorch model, which is only needed
+        # when the quantized model is not in ONNX_DIR yet
+        Metric.__init__(self, disable_multiprocessing=True)
+        self._tokenizer = BertTokenizer.from_pretrained(BERT_MODEL)
+        self._model = None
+        self._pooler_output = False
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._embeddings: OrderedDict[bytes, torch.Tensor] = OrderedDict()
+        self.lock = threading.Lock()
+        sample = dict(self._tokenizer(["text"], return_tensors="pt"))
+        self.session = quantized_session(
+            BERT_MODEL,
+            lambda: BertModel.from_pretrained(BERT_MODEL),
+            sample,
+            ["last_hidden_state", "pooler_output"],
+            threads or session_threads(),
+        )
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def _encode(self, texts: list[str]) -> torch.Tensor:
+        with self.lock:
+            tokens = self._tokenizer(
+                texts,
+                padding="longest",
+                truncation=True,
+                max_length=MAX_LENGTH,
+                return_tensors="np",
+            )
+        feed = {name: tokens[name].astype(np.int64) for name in self.input_names}
+        hidden, pooled = self.session.run(None, feed)
+        if self._pooler_output:
+            return torch.from_numpy(pooled)
+        mask = tokens["attention_mask"][..., None].astype(np.float32)
+        return torch.from_numpy((hidden * mask).sum(axis=1) / mask.sum(axis=1))
+
+
+def get_onnx_deberta_scorer(threads: int | None = None) -> OnnxDebertaScorer:
+    """
+    Returns the OnnxDebertaScorer shared by every client in the process. The threads
+    of its session are set by the call that creates it
+    """
+    return shared_scorer("onnx_deberta", lambda: OnnxDebertaScorer(threads=threads))
+
+
+def get_onnx_bert_scorer(threads: int | None = None) -> OnnxBertScorer:
+    """
+    Returns the OnnxBertScorer shared by every client in the process. The threads of
+    its session are set by the call that creates it
+    """
+    return shared_scorer("onnx_bert", lambda: OnnxBertScorer(threads=threads))
@@ -0,0 +1,44 @@
+"""
+Package that incorporates the rate limiter used to throttle requests to the DataworkZ API
+"""
+
+import asyncio
+import time
+
+
+class TokenBucketRateLimiter:
+    """
+    Async token bucket rate limiter. The bucket holds at most max_tokens tokens and is
+    refilled with max_tokens tokens every refill_interval seconds, so bursts of up to
+    max_tokens requests go out immediately while the sustained rate is bounded by
+    max_tokens / refill_interval requests per second.
+    """
+
+    def __init__(self, max_tokens: int, refill_interval: float = 1.0):
+        if max_tokens < 1:
+            raise ValueError("ERROR: max_tokens must be at least 1")
+        self.max_tokens: int = max_tokens
+        self.refill_interval: float = refill_interval
+        self.tokens: float = max_tokens
+        self.updated_at: float = time.monotonic()
+        self.lock: asyncio.Lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        refill = (now - self.updated_at) * self.max_tokens / self.refill_interval
+        self.tokens = min(self.max_tokens, self.tokens + refill)
+        self.updated_at = now
+
+    async def acquire(self):
+        """
+        Waits until a token is available and consumes it. Waiters are served in
+        the order they called acquire
+        """
+        async with self.lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep(
+                    (1 - self.tokens) * self.refill_interval / self.max_tokens
+                )
+                self._refill()
+            self.tokens -= 1
@@ -0,0 +1,66 @@
+"""
+Package that incorporates the writer used to stream benchmark results to a CSV file
+"""
+
+import csv
+import os
+from typing import Iterable
+
+
+class CSVResultsWriter:
+    """
+    Streams benchmark results to a CSV file as they complete, so the results are never
+    all held in memory. The header is taken from the first result written: the leading
+    columns followed by its remaining keys. The file is synced to disk every
+    fsync_every rows and when the writer is closed
+
+    Attributes:
+        output_file (str): path of the CSV file
+        leading_columns (list[str]): columns written before the metric columns
+        fsync_every (int): number of rows between two syncs to disk
+        fieldnames (list[str]): columns of the file, set by the first write
+    """
+
+    def __init__(
+        self,
+        output_file: str,
+        leading_columns: Iterable[str],
+        fsync_every: int = 100,
+    ):
+        self.output_file: str = output_file
+        self.leading_columns: list[str] = list(leading_columns)
+        self.fsync_every: int = fsync_every
+        self.fieldnames: list[str] | None = None
+        self._file = None
+        self._writer: csv.DictWriter | None = None
+        self._rows: int = 0
+
+    def __enter__(self):
+        self._file = open(self.output_file, "w", newline="")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._sync()
+        self._file.close()
+
+    def write(self, result: dict):
+        """
+        Appends a result row to the file
+        """
+        if self._writer is None:
+            # the metric columns are the same for every result, take them from the first one
+            self.fieldnames = self.leading_columns + [
+                key for key in result if key not in self.leading_columns
+            ]
+            self._writer = csv.DictWriter(
+                self._file, fieldnames=self.fieldnames, extrasaction="ignore"
+            )
+            self._writer.writeheader()
+        self._writer.writerow(result)
+        self._rows += 1
+        if self._rows % self.fsync_every == 0:
+            self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
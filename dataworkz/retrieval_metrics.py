@@ -0,0 +1,105 @@
+"""
+Package that incorporates the retrieval metrics of PrecisionRecallF1 and
+RankedRetrievalMetrics computed from a single relevance matrix per query
+"""
+
+from functools import lru_cache
+from math import log
+
+import numpy as np
+from continuous_eval.metrics.retrieval.matching_strategy import (
+    MatchingStrategy,
+    MatchingStrategyType,
+)
+
+
+@lru_cache(maxsize=1024)
+def _ideal_dcg(n: int) -> float:
+    idcg = 0
+    for i in range(n):
+        idcg += 1 / log(i + 2, 2)
+    return idcg
+
+
+def relevance_matrix(
+    matching_strategy: MatchingStrategy,
+    retrieved_context: list[str],
+    ground_truth_components: list[str],
+) -> np.ndarray:
+    """
+    Returns the boolean matrix of the relevance of every retrieved chunk (rows) to
+    every ground truth component (columns)
+    """
+    relevance = np.fromiter(
+        (
+            matching_strategy.is_relevant(chunk, gt_component)
+            for chunk in retrieved_context
+            for gt_component in ground_truth_components
+        ),
+        dtype=bool,
+        count=len(retrieved_context) * len(ground_truth_components),
+    )
+    return relevance.reshape(len(retrieved_context), len(ground_truth_components))
+
+
+def retrieval_scores(
+    matching_strategy: MatchingStrategy,
+    retrieved_context: list[str],
+    ground_truth_context,
+) -> dict:
+    """
+    Computes the scores of PrecisionRecallF1 followed by the ones of
+    RankedRetrievalMetrics, equal to theirs. The continuous_eval metrics match every
+    chunk against the ground truth context once per metric and once per repeated
+    ground truth component, here each chunk is matched once against each distinct
+    component, and the metrics are reduced from the resulting matrix
+
+    :param ground_truth_context: The ground truth components, iterated the same way
+        the continuous_eval metrics do.
+    """
+    if matching_strategy.type != MatchingStrategyType.CHUNK_MATCH:
+        raise ValueError("ERROR: retrieval scores are calculated at chunk level")
+    ground_truth_components = list(ground_truth_context)
+    # the metrics only depend on the distinct components, in order of first occurrence
+    distinct_components = list(dict.fromkeys(ground_truth_components))
+    relevance = relevance_matrix(
+        matching_strategy, retrieved_context, distinct_components
+    )
+    relevant_chunks = relevance.any(axis=1)
+    precision = (
+        int(relevant_chunks.sum()) / len(retrieved_context)
+        if retrieved_context
+        else 0.0
+    )
+    recall = (
+        int(relevance.any(axis=0).sum()) / len(distinct_components)
+        if distinct_components
+        else 0.0
+    )
+    try:
+        f1 = 2 * (precision * recall) / (precision + recall)
+    except ZeroDivisionError:
+        f1 = 0.0
+    ranks = np.flatnonzero(relevant_chunks).tolist()
+    # summed in order of rank, the same way RankedRetrievalMetrics does
+    average_precision = 0
+    for relevant, i in enumerate(ranks, 1):
+        average_precision += relevant / (i + 1)
+    average_precision = average_precision / len(ranks) if ranks else 0
+    reciprocal_rank = 1 / (ranks[0] + 1) if ranks else 0
+    # each ground truth component is credited to the first relevant chunk only
+    matched = np.zeros(len(distinct_components), dtype=bool)
+    dcg = 0
+    for i in ranks:
+        unmatched = np.flatnonzero(relevance[i] & ~matched)
+        if len(unmatched):
+            matched[unmatched[0]] = True
+            dcg += 1 / log(i + 2, 2)
+    return {
+        "context_precision": precision,
+        "context_recall": recall,
+        "context_f1": f1,
+        "average_precision": average_precision,
+        "reciprocal_rank": reciprocal_rank,
+        "ndcg": dcg / _ideal_dcg(len(ground_truth_components)),
+    }
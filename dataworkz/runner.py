@@ -0,0 +1,209 @@
+"""
+Package that incorporates the benchmark runner shared by the benchmark_*.py scripts. A
+script only holds its configuration: the QA data file, the QNA systems to compare for
+each source and the LLM provider
+"""
+
+import asyncio
+import datetime as dt
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv
+
+from .dtwz_ai import AIDtwz
+from .log import TIMESTAMP_FORMAT, init_logger
+from .results_writer import CSVResultsWriter
+from .semantic_cache import SemanticCache
+
+import logging
+
+logger = logging.getLogger()
+
+# columns of the results that precede the metric scores
+RESULT_COLUMNS = ["question", "gt_answer", "system_answer", "source", "experiment_name"]
+# answer metrics that are not needed for stats generation, they are never added to
+# the results
+DROP_COLUMNS = frozenset(
+    [
+        "rouge_l_recall",
+        "rouge_l_precision",
+        "rouge_l_f1",
+        "token_overlap_recall",
+        "token_overlap_precision",
+        "token_overlap_f1",
+        "token_overlap_faithfulness",
+        "rouge_p_by_sentence",
+        "token_overlap_p_by_sentence",
+        "bleu_score_by_sentence",
+    ]
+)
+
+
+async def process_system(
+    dtwz_ai_client: AIDtwz,
+    workers: asyncio.Semaphore,
+    index: int,
+    row: tuple,
+    system: dict,
+) -> tuple[dict, dict]:
+    """
+    Runs one question of the QA data against one experiment and scores its retrieval.
+    The row holds the question, ground truth answer, source and ground truth context
+
+    :return: The result with the retrieval scores, and the answer to score later on.
+    """
+    async with workers:
+        expt_name = system["expt_name"]
+        uuid = system["uuid"]
+        print("Processing query No: ", index, expt_name)
+        question, gt_answer, source, gt_context = row
+        debug_str = (
+            f"INFO: running {source} experiment: {expt_name} on question:{question}..."
+        )
+        logger.debug(debug_str)
+        # get the merge input chunks from DTWZ system response, which is used to score retrieval later on.
+        logger.debug(f"INFO: fetching answer...")
+        fetched = await dtwz_ai_client.aget_chunks(question, uuid)
+        if fetched is None or fetched[2] is None:
+            logger.error(f"ERROR: could not fetch answer data")
+            raise RuntimeError("ERROR: could not fetch answer data")
+        answer, context, merge_input_chunks = fetched
+        # compute metrics on the retrieved answer against ground truth answer.
+        logger.debug(f"INFO: computing metrics...")
+        scores = await dtwz_ai_client.score_retrieval(
+            question, gt_context, merge_input_chunks
+        )
+        # the answer is scored later, together with all the other answers
+        answer_row = {
+            "question": question,
+            "gt_answer": gt_answer,
+            "answer": answer,
+            "context": context,
+        }
+        result = {
+            "question": question,
+            "gt_answer": gt_answer,
+            "system_answer": answer,
+            "source": source,
+            "experiment_name": expt_name,
+        }
+        if isinstance(scores, asyncio.Future):
+            # the LLM metrics are scored in batch, the scores are added once they resolve
+            answer_row["retrieval_scores"] = scores
+        else:
+            result.update(scores)
+        return result, answer_row
+
+
+async def run_benchmark(
+    csv_path: str,
+    benchmark_name_to_qna: dict[str, list[dict]],
+    llm_provider_id: str,
+    answer_metrics: bool = False,
+    additional_metrics: bool = False,
+    gt_context_column: str = "gt_context",
+    max_concurrency: int = 8,
+    max_requests_per_second: int = 2,
+    max_workers: int = 16,
+    semantic_cache_file: str | None = None,
+    onnx_scorers: bool = False,
+    llm_batch_mode: bool = False,
+) -> None:
+    """
+    Runs every question of the QA data in csv_path against every experiment of its
+    source in benchmark_name_to_qna, and saves the results and their averages per
+    experiment to a new folder of benchmark_results.
+
+    :param gt_context_column: Column of the QA data the retrieved chunks are scored against.
+    :param max_concurrency: Maximum number of concurrent requests to the DTWZ AI API.
+    :param max_requests_per_second: Throttles the requests to avoid rate limiting by the DTWZ AI API.
+    :param max_workers: Maximum number of (question, experiment) pairs processed at the same time.
+    :param semantic_cache_file: Path of the semantic cache file without extension, near
+        duplicate questions are answered from the cache when set.
+    :param onnx_scorers: Score the answers with int8 quantized models run by ONNX Runtime.
+    :param llm_batch_mode: Score the LLM based context precision with the Batch API, at about half
+        the cost but with up to 24 hours of latency.
+    """
+    init_logger("dtwz")
+    qa_columns = ["question", "gt_answer", "source", gt_context_column]
+    qa_data = pd.read_csv(csv_path, engine="pyarrow", dtype_backend="pyarrow")
+    # Create a save location for this run
+    run_name = dt.datetime.now().strftime(TIMESTAMP_FORMAT)
+    benchmark_path = f"./benchmark_results/{run_name}_DTWZ"
+    os.makedirs(benchmark_path, exist_ok=True)
+    output_file = f"{benchmark_path}/results_dtwz.csv"
+    workers = asyncio.Semaphore(max_workers)
+    semantic_cache = None
+    if semantic_cache_file is not None:
+        semantic_cache = SemanticCache(path=semantic_cache_file)
+    results = []
+    answer_rows = []
+    with CSVResultsWriter(output_file, RESULT_COLUMNS) as results_writer:
+        async with AIDtwz(
+            answer_metrics,
+            additional_metrics,
+            max_concurrency,
+            max_requests_per_second,
+            semantic_cache,
+            onnx_scorers,
+            llm_batch_mode,
+        ) as dtwz_ai_client:
+            dtwz_ai_client.set_llm_provider_id(llm_provider_id)
+            # dispatch every question to every experiment of its source (row[2])
+            # concurrently, requests to DTWZ AI API are throttled by the client
+            rows = qa_data[qa_columns].itertuples(index=False, name=None)
+            tasks = [
+                process_system(dtwz_ai_client, workers, index, row, system)
+                for index, row in enumerate(rows)
+                for system in benchmark_name_to_qna[row[2]]
+            ]
+            # write the results to the csv file as they complete.
+            for task in asyncio.as_completed(tasks):
+                result, answer_row = await task
+                if answer_metrics:
+                    # hold the results until their answers are scored
+                    results.append(result)
+                    answer_rows.append(answer_row)
+                else:
+                    results_writer.write(result)
+            if answer_metrics:
+                # compute metrics on all the answers against ground truth answers at once.
+                logger.debug(f"INFO: computing answer metrics...")
+                await dtwz_ai_client.flush_context_precision()
+                answer_scores = await dtwz_ai_client.score_system_batch(answer_rows)
+                for result, answer_row, scores in zip(
+                    results, answer_rows, answer_scores, strict=True
+                ):
+                    if "retrieval_scores" in answer_row:
+                        result.update(answer_row["retrieval_scores"].result())
+                    result.update(
+                        (key, value)
+                        for key, value in scores.items()
+                        if key not in DROP_COLUMNS
+                    )
+                    results_writer.write(result)
+
+    if results_writer.fieldnames is None:
+        # no question produced a result, for example an empty QA data file
+        logger.error(f"ERROR: no results were written to {output_file}, skipping stats")
+        return
+    logger.debug(f"INFO: generating stats")
+    # read back the numeric metric columns only, the text columns are not needed
+    metric_columns = results_writer.fieldnames[len(RESULT_COLUMNS) :]
+    df = pyarrow.csv.read_csv(
+        output_file,
+        parse_options=pyarrow.csv.ParseOptions(newlines_in_values=True),
+        convert_options=pyarrow.csv.ConvertOptions(
+            include_columns=["source", "experiment_name"] + metric_columns
+        ),
+    ).to_pandas()
+    # Create a Pivot Table with the Average of Numeric Value Columns
+    pivot_table = df.groupby(["source", "experiment_name"])[metric_columns].mean()
+
+    stats_df = pivot_table.reset_index()
+    stats_file = f"{benchmark_path}/stats_dtwz.csv"
+    pyarrow.csv.write_csv(
+        pa.Table.from_pandas(stats_df, preserve_index=False), stats_file
+    )
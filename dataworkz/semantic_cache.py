@@ -0,0 +1,252 @@
+"""
+Package that incorporates the semantic cache used to answer near duplicate questions
+without a round trip to the DataworkZ API
+"""
+
+import os
+import pickle
+import threading
+import time
+
+import numpy as np
+
+import logging
+
+logger = logging.getLogger()
+
+
+class SemanticCache:
+    """
+    Cache of DataworkZ API responses keyed by the embedding of the question. A lookup
+    hits when a question asked to the same system has a cosine similarity above the
+    threshold. Entries expire after ttl seconds, and when the cache is full the least
+    recently used entry is evicted. The answer of a system depends on its LLM provider,
+    an entry only hits for the provider it was cached with. The embeddings are L2
+    normalized and searched with a single inner product over all the entries.
+
+    The cache is saved to <path>.pkl when a path is set, and loaded back from it when it
+    is created. It is safe to use from several threads.
+
+    Attributes:
+        threshold (float): Minimum cosine similarity for a hit. Default is 0.85.
+        max_entries (int): Maximum number of cached responses. Default is 10000.
+        ttl (float): Lifetime of an entry in seconds. Default is 7 days.
+        path (str): Path of the cache file without extension, or None to keep it in memory only.
+        model_name (str): Sentence transformers model that embeds the questions.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.85,
+        max_entries: int = 10_000,
+        ttl: float = 7 * 24 * 3600,
+        path: str | None = None,
+        model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+    ):
+        self.threshold: float = threshold
+        self.max_entries: int = max_entries
+        self.ttl: float = ttl
+        self.path: str | None = path
+        self.model_name: str = model_name
+        # one slot per entry, evicted slots are reused
+        self._embeddings: np.ndarray | None = None
+        self._system_ids = np.empty(max_entries, dtype=object)
+        self._llm_provider_ids = np.empty(max_entries, dtype=object)
+        self._values: list = [None] * max_entries
+        self._created = np.zeros(max_entries)
+        self._used = np.zeros(max_entries)
+        self._size: int = 0
+        self._encoder = None
+        self._encoder_lock = threading.Lock()
+        # guards the entries, the queries are embedded outside of it
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path + ".pkl"):
+            self.load()
+
+    @property
+    def encoder(self):
+        with self._encoder_lock:
+            if self._encoder is None:
+                # imported on first use, sentence transformers imports torch
+                from sentence_transformers import SentenceTransformer
+
+                from .semantic_metrics import DEVICE
+
+                self._encoder = SentenceTransformer(self.model_name, device=DEVICE)
+        return self._encoder
+
+    def embed(self, query: str) -> np.ndarray:
+        """
+        Returns the L2 normalized embedding of the query
+        """
+        return self.encoder.encode(
+            query, normalize_embeddings=True, show_progress_bar=False
+        ).astype(np.float32)
+
+    def search(
+        self,
+        embedding: np.ndarray,
+        system_id: str,
+        llm_provider_id: str | None = None,
+    ) -> tuple[int, float]:
+        """
+        Finds the live entry of system_id and llm_provider_id most similar to the
+        embedding.
+
+        :return: The slot of the entry and its cosine similarity, or (-1, 0.0) if the
+            system has no live entries for the provider.
+        """
+        if self._size == 0:
+            return -1, 0.0
+        similarity = self._embeddings[: self._size] @ embedding
+        live = (
+            (self._system_ids[: self._size] == system_id)
+            & (self._llm_provider_ids[: self._size] == llm_provider_id)
+            & (self._created[: self._size] > time.time() - self.ttl)
+        )
+        similarity = np.where(live, similarity, -np.inf)
+        idx = int(np.argmax(similarity))
+        if not live[idx]:
+            return -1, 0.0
+        return idx, float(similarity[idx])
+
+    def get(
+        self,
+        system_id: str,
+        query: str,
+        embedding: np.ndarray | None = None,
+        llm_provider_id: str | None = None,
+    ):
+        """
+        Returns the cached response of the most similar question asked to system_id
+        with llm_provider_id, or None if no question is similar enough. Pass the
+        embedding of the query if it is already known, to reuse it for the put after
+        a miss
+        """
+        if embedding is None:
+            embedding = self.embed(query)
+        with self._lock:
+            idx, similarity = self.search(embedding, system_id, llm_provider_id)
+            if idx < 0 or similarity <= self.threshold:
+                return None
+            self._used[idx] = time.time()
+            return self._values[idx]
+
+    def put(
+        self,
+        system_id: str,
+        query: str,
+        value,
+        embedding: np.ndarray | None = None,
+        llm_provider_id: str | None = None,
+    ):
+        """
+        Caches the response of system_id with llm_provider_id to the query, embedding
+        it unless its embedding is passed
+        """
+        if embedding is None:
+            embedding = self.embed(query)
+        with self._lock:
+            self._put(system_id, llm_provider_id, embedding, value)
+
+    def _put(
+        self,
+        system_id: str,
+        llm_provider_id: str | None,
+        embedding: np.ndarray,
+        value,
+    ):
+        if self._embeddings is None:
+            self._embeddings = np.zeros(
+                (self.max_entries, len(embedding)), dtype=np.float32
+            )
+        if self._size < self.max_entries:
+            idx = self._size
+            self._size += 1
+        else:
+            # evict the expired or else the least recently used entry
+            expired = self._created < time.time() - self.ttl
+            idx = int(np.argmin(np.where(expired, -np.inf, self._used)))
+        now = time.time()
+        self._embeddings[idx] = embedding
+        self._system_ids[idx] = system_id
+        self._llm_provider_ids[idx] = llm_provider_id
+        self._values[idx] = value
+        self._created[idx] = now
+        self._used[idx] = now
+
+    def save(self):
+        """
+        Writes the embeddings and the cached responses to <path>.pkl. They are written
+        to a temporary file first and moved in place, so a failed save leaves the
+        previous cache untouched
+        """
+        if self.path is None or self._size == 0:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock:
+            state = {
+                "embeddings": self._embeddings[: self._size].copy(),
+                "system_ids": self._system_ids[: self._size].tolist(),
+                "llm_provider_ids": self._llm_provider_ids[: self._size].tolist(),
+                "values": self._values[: self._size],
+                "created": self._created[: self._size].copy(),
+                "used": self._used[: self._size].copy(),
+            }
+        tmp_path = f"{self.path}.pkl.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(state, f)
+            os.replace(tmp_path, self.path + ".pkl")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def load(self):
+        """
+        Reads the cache back from <path>.pkl, keeping the most recently used entries if
+        there are more than max_entries. A cache file that cannot be read, or whose
+        embeddings and responses do not match, is logged and the cache starts empty
+        """
+        try:
+            with open(self.path + ".pkl", "rb") as f:
+                state = pickle.load(f)
+            embeddings = np.asarray(state["embeddings"], dtype=np.float32)
+            created = np.asarray(state["created"], dtype=np.float64)
+            used = np.asarray(state["used"], dtype=np.float64)
+            size = len(state["values"])
+            if embeddings.ndim != 2 or not (
+                len(embeddings)
+                == len(state["system_ids"])
+                == len(state["llm_provider_ids"])
+                == len(created)
+                == len(used)
+                == size
+            ):
+                raise ValueError(
+                    f"{len(embeddings)} embeddings for {size} cached responses"
+                )
+        except (
+            OSError,
+            EOFError,
+            pickle.UnpicklingError,
+            AttributeError,
+            KeyError,
+            TypeError,
+            ValueError,
+        ) as e:
+            logger.error(f"ERROR: ignoring the semantic cache {self.path}: {e!r}")
+            return
+        keep = np.argsort(-used)[: self.max_entries]
+        self._size = len(keep)
+        self._embeddings = np.zeros(
+            (self.max_entries, embeddings.shape[1]), dtype=np.float32
+        )
+        self._embeddings[: self._size] = embeddings[keep]
+        for slot, idx in enumerate(keep):
+            self._system_ids[slot] = state["system_ids"][idx]
+            self._llm_provider_ids[slot] = state["llm_provider_ids"][idx]
+            self._values[slot] = state["values"][idx]
+        self._created[: self._size] = created[keep]
+        self._used[: self._size] = used[keep]
+        logger.debug(f"INFO: loaded {self._size} cached responses from {self.path}")
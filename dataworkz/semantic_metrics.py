@@ -0,0 +1,251 @@
+"""
+Package that incorporates the semantic answer metrics used by AIDtwz. The continuous_eval
+metrics load a fresh transformer model on the CPU for every call, these keep a single
+model per process loaded on the fastest available device, in half precision on GPU,
+and score answers in batched forward passes
+"""
+
+import hashlib
+import threading
+import warnings
+from collections import OrderedDict, defaultdict
+from typing import Callable, TypeVar
+
+import numpy as np
+import pandas as pd
+import torch
+import transformers
+from sentence_transformers import CrossEncoder
+from continuous_eval.metrics.generation.text.bert import BertSimilarity
+from continuous_eval.metrics.generation.text.semantic import (
+    DebertaAnswerScores,
+    BertAnswerSimilarity,
+    BertAnswerRelevance,
+)
+
+DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+# half precision halves the memory traffic on GPU, CPU kernels are faster in FP32
+DTYPE = torch.float16 if DEVICE == "cuda" else torch.float32
+BATCH_SIZE = 64
+# longest input in tokens of the BERT and DeBERTa models, longer texts are truncated
+MAX_LENGTH = 512
+
+# the checkpoints load with unused weights warnings that are expected
+transformers.logging.set_verbosity_error()
+
+T = TypeVar("T")
+# scorers shared by every client in the process, by name
+_SCORERS: dict[str, object] = {}
+# one lock per name, so loading one model does not block fetching the others
+_SCORER_LOCKS: defaultdict[str, threading.Lock] = defaultdict(threading.Lock)
+_SCORER_LOCKS_LOCK = threading.Lock()
+
+
+def shared_scorer(name: str, factory: Callable[[], T]) -> T:
+    """
+    Returns the scorer registered as name, creating it with factory on the first call.
+    The scorers are fetched from the worker threads of the metrics too, the lock of the
+    name makes sure its model is only ever loaded once
+    """
+    scorer = _SCORERS.get(name)
+    if scorer is not None:
+        return scorer
+    with _SCORER_LOCKS_LOCK:
+        lock = _SCORER_LOCKS[name]
+    with lock:
+        if name not in _SCORERS:
+            _SCORERS[name] = factory()
+        return _SCORERS[name]
+
+
+class DebertaScorer:
+    """
+    NLI cross encoder used by DebertaAnswerScores, loaded once on DEVICE
+    """
+
+    def __init__(self, batch_size: int = BATCH_SIZE):
+        self.model = CrossEncoder(
+            "cross-encoder/nli-deberta-v3-large",
+            device=DEVICE,
+            max_length=MAX_LENGTH,
+            tokenizer_args={"use_fast": False},
+        )
+        self.model.model.to(DTYPE)
+        self.batch_size = batch_size
+
+    def __call__(self, sentence_pairs):
+        """
+        Returns the entailment logits for each (premise, hypothesis) pair
+        """
+        with torch.inference_mode():
+            return self.model.predict(
+                sentence_pairs, batch_size=self.batch_size, show_progress_bar=False
+            )
+
+
+class BertScorer(BertSimilarity):
+    """
+    BertSimilarity with the BERT model loaded once on DEVICE. The embeddings of the
+    last cache_size texts are kept, as the same questions, ground truth answers and
+    answers are embedded by several metrics and for several systems. The token
+    embeddings are averaged over the attention mask, so the embedding of a text does
+    not depend on the padding of the batch it is embedded in
+    """
+
+    def __init__(self, batch_size: int = BATCH_SIZE, cache_size: int = 4096):
+        super().__init__()
+        self._model = self._model.to(DEVICE, DTYPE).eval()
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._embeddings: OrderedDict[bytes, torch.Tensor] = OrderedDict()
+
+    def _encode(self, texts: list[str]) -> torch.Tensor:
+        tokens = self._tokenizer(
+            texts,
+            padding="longest",
+            truncation=True,
+            max_length=MAX_LENGTH,
+            return_tensors="pt",
+        ).to(DEVICE)
+        with torch.inference_mode():
+            output = self._model(
+                tokens["input_ids"], attention_mask=tokens["attention_mask"]
+            )
+        if self._pooler_output:
+            return output.pooler_output.float()
+        mask = tokens["attention_mask"].unsqueeze(-1).to(output[0].dtype)
+        return ((output[0] * mask).sum(dim=1) / mask.sum(dim=1)).float()
+
+    def embed(self, texts: list[str]) -> torch.Tensor:
+        """
+        Returns the embeddings of the texts, only running BERT on the texts that are not
+        cached
+        """
+        # key the cache by a digest so it does not hold on to long texts
+        keys = [hashlib.blake2b(t.encode(), digest_size=16).digest() for t in texts]
+        embeddings = {}
+        for key in keys:
+            if key in self._embeddings:
+                self._embeddings.move_to_end(key)
+                embeddings[key] = self._embeddings[key]
+        missing = list(
+            {k: t for k, t in zip(keys, texts) if k not in embeddings}.items()
+        )
+        for i in range(0, len(missing), self.batch_size):
+            batch = missing[i : i + self.batch_size]
+            for (key, _), embedding in zip(batch, self._encode([t for _, t in batch])):
+                embeddings[key] = embedding
+                self._embeddings[key] = embedding
+                if len(self._embeddings) > self.cache_size:
+                    self._embeddings.popitem(last=False)
+        return torch.stack([embeddings[key] for key in keys])
+
+    def batch(self, prediction: list[str], reference: list[str]):
+        semantic_similarity = torch.nn.functional.cosine_similarity(
+            self.embed(prediction), self.embed(reference), dim=1
+        )
+        similarity = torch.clip(semantic_similarity, min=0.0, max=1.0).tolist()
+        return {"bert_similarity": similarity}
+
+
+def get_deberta_scorer() -> DebertaScorer:
+    """
+    Returns the DebertaScorer shared by every client in the process
+    """
+    return shared_scorer("deberta", DebertaScorer)
+
+
+def get_bert_scorer() -> BertScorer:
+    """
+    Returns the BertScorer shared by every client in the process
+    """
+    return shared_scorer("bert", BertScorer)
+
+
+class BatchDebertaAnswerScores(DebertaAnswerScores):
+    """
+    DebertaAnswerScores that scores the answers with a preloaded DebertaScorer
+    """
+
+    def __init__(self, scorer: DebertaScorer, reverse: bool = False):
+        super().__init__(reverse=reverse)
+        self.scorer = scorer
+
+    def batch(self, answer, ground_truth_answers, **kwargs):
+        warnings.filterwarnings("ignore", category=UserWarning)
+        entailment_key, contradiction_key = self._ret_keys()
+        sentence_pairs = []
+        ids = []
+        for i, (val, ref) in enumerate(zip(answer, ground_truth_answers)):
+            for gt_answer in ref:
+                if self.reverse:
+                    # premise=ground truth => hypothesis=answer
+                    sentence_pairs.append((gt_answer, val))
+                else:
+                    # premise=answer => hypothesis=ground truth
+                    sentence_pairs.append((val, gt_answer))
+                ids.append(i)
+        df = pd.DataFrame(
+            {entailment_key: [], contradiction_key: [], "ids": []}, dtype=float
+        )
+        if sentence_pairs:
+            logits = np.asarray(self.scorer(sentence_pairs))
+            probs = torch.nn.functional.softmax(torch.from_numpy(logits), dim=1)
+            df = pd.DataFrame(
+                {
+                    entailment_key: probs[:, 1],
+                    contradiction_key: probs[:, 0],
+                    "ids": ids,
+                }
+            )
+        # score each answer with the ground truth answer it entails the most, answers
+        # without ground truth answers have no pairs and score nan
+        idx = df.groupby("ids")[entailment_key].idxmax()
+        scores = df.loc[idx, [entailment_key, contradiction_key]].set_index(idx.index)
+        return scores.reindex(range(len(answer))).to_dict("records")
+
+    def compute(self, answer, ground_truth_answers, **kwargs):
+        return self.batch([answer], [ground_truth_answers])[0]
+
+
+class BatchBertAnswerSimilarity(BertAnswerSimilarity):
+    """
+    BertAnswerSimilarity that embeds the answers with a preloaded BertScorer
+    """
+
+    def __init__(self, scorer: BertScorer):
+        super().__init__()
+        self.scorer = scorer
+
+    def batch(self, answer, ground_truth_answers):
+        prediction, reference, ids = self._preprocess_dataset(
+            answer, ground_truth_answers
+        )
+        similarity = []
+        if prediction:
+            score = self.scorer.batch(prediction=prediction, reference=reference)
+            similarity = score["bert_similarity"]
+        df = pd.DataFrame({"bert_answer_similarity": similarity, "ids": ids})
+        # answers without ground truth answers have no pairs and score nan
+        ret = df.groupby("ids").max().reindex(range(len(answer)))
+        return [{"bert_answer_similarity": x} for x in ret["bert_answer_similarity"]]
+
+    def compute(self, answer, ground_truth_answers, **kwargs):
+        return self.batch([answer], [ground_truth_answers])[0]
+
+
+class BatchBertAnswerRelevance(BertAnswerRelevance):
+    """
+    BertAnswerRelevance that embeds the answers with a preloaded BertScorer
+    """
+
+    def __init__(self, scorer: BertScorer):
+        super().__init__()
+        self.scorer = scorer
+
+    def batch(self, answer, question):
+        score = self.scorer.batch(prediction=answer, reference=question)
+        return [{"bert_answer_relevance": x} for x in score["bert_similarity"]]
+
+    def compute(self, answer, question):
+        return self.batch([answer], [question])[0]
@@ -0,0 +1,102 @@
+import copy
+import random
+
+import pytest
+
+from dataworkz.dtwz_ai import AIDtwz
+
+TARGET = "MERGE_NEIGHBOURING_CONTEXT"
+
+
+def recursive_find_key_by_value(json_obj, target_value):
+    # the recursive search find_key_by_value replaces
+    if isinstance(json_obj, dict):
+        for value in json_obj.values():
+            if value == target_value:
+                return json_obj["data"]["Input"]
+            elif isinstance(value, (dict, list)):
+                found = recursive_find_key_by_value(value, target_value)
+                if found:
+                    return found
+    elif isinstance(json_obj, list):
+        for item in json_obj:
+            found = recursive_find_key_by_value(item, target_value)
+            if found:
+                return found
+    return None
+
+
+def step(name, chunks, **children):
+    return {"name": name, "data": {"Input": chunks}, **children}
+
+
+PROBE = {
+    "steps": [
+        step("RETRIEVE", [{"Content": "retrieved"}]),
+        step(
+            "RERANK",
+            [{"Content": "reranked"}],
+            substeps=[
+                step("SCORE", []),
+                # a match inside an earlier child comes before a later sibling match
+                {"nested": [step(TARGET, [{"Content": "nested merge"}])]},
+            ],
+        ),
+        step(TARGET, [{"Content": "merge"}]),
+    ],
+    "answer": "the answer",
+}
+
+CASES = [
+    PROBE,
+    # a match with an empty input is skipped
+    {"steps": [step(TARGET, []), step(TARGET, [{"Content": "second"}])]},
+    {"steps": [{"inner": step(TARGET, None)}, step(TARGET, [{"Content": "later"}])]},
+    # a match after the child values of its own dictionary
+    {
+        "child": {"deep": step(TARGET, [{"Content": "deep"}])},
+        "name": TARGET,
+        "data": {"Input": [{"Content": "own"}]},
+    },
+    # a match with an empty input at the top level is returned as is
+    step(TARGET, []),
+    {"steps": [step("RETRIEVE", [{"Content": "retrieved"}])]},
+    [],
+    "not json",
+]
+
+
+@pytest.fixture(scope="module")
+def client():
+    return AIDtwz()
+
+
+@pytest.mark.parametrize("probe", CASES)
+def test_find_key_by_value_matches_recursive_search(client, probe):
+    assert client.find_key_by_value(probe, TARGET) == recursive_find_key_by_value(
+        probe, TARGET
+    )
+
+
+def test_find_key_by_value_visits_children_where_they_appear(client):
+    assert client.find_key_by_value(PROBE, TARGET) == [{"Content": "nested merge"}]
+
+
+def random_probe(rng, depth=0):
+    if depth > 3 or rng.random() < 0.2:
+        return rng.choice([TARGET, "other", 1, None])
+    if rng.random() < 0.4:
+        return [random_probe(rng, depth + 1) for _ in range(rng.randint(0, 3))]
+    node = {f"k{i}": random_probe(rng, depth + 1) for i in range(rng.randint(0, 3))}
+    node["data"] = {"Input": rng.choice([[], None, [{"Content": f"c{depth}"}]])}
+    keys = list(node)
+    rng.shuffle(keys)
+    return {key: node[key] for key in keys}
+
+
+def test_find_key_by_value_matches_recursive_search_on_random_probes(client):
+    rng = random.Random(0)
+    for _ in range(500):
+        probe = random_probe(rng)
+        expected = recursive_find_key_by_value(copy.deepcopy(probe), TARGET)
+        assert client.find_key_by_value(probe, TARGET) == expected
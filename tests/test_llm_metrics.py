@@ -0,0 +1,181 @@
+import json
+import math
+from types import SimpleNamespace
+
+import pytest
+from continuous_eval.metrics.retrieval import ContextPrecision
+
+from dataworkz.llm_metrics import BatchContextPrecision
+
+
+def body(score, top_logprobs):
+    """
+    Returns a chat completion body answering score, with the top logprobs of its
+    score token
+    """
+    content = json.dumps({"reasoning": "because", "score": score})
+    return {
+        "choices": [
+            {
+                "message": {"content": content},
+                "logprobs": {
+                    "content": [
+                        {"token": '{"', "top_logprobs": []},
+                        {
+                            "token": f" {score}",
+                            "top_logprobs": [
+                                {"token": token, "logprob": logprob}
+                                for token, logprob in top_logprobs
+                            ],
+                        },
+                    ]
+                },
+            }
+        ]
+    }
+
+
+def completion(body):
+    """
+    Returns body as the object returned by the OpenAI client
+    """
+    choice = body["choices"][0]
+    return SimpleNamespace(
+        choices=[
+            SimpleNamespace(
+                message=SimpleNamespace(content=choice["message"]["content"]),
+                logprobs=SimpleNamespace(
+                    content=[
+                        SimpleNamespace(
+                            token=token["token"],
+                            top_logprobs=[
+                                SimpleNamespace(**logprob)
+                                for logprob in token["top_logprobs"]
+                            ],
+                        )
+                        for token in choice["logprobs"]["content"]
+                    ]
+                ),
+            )
+        ]
+    )
+
+
+CASES = [
+    [body("yes", [("yes", -0.1), ("no", -2.5)])],
+    [body("no", [("no", -0.01), (" yes", -4.0)])],
+    [
+        body("yes", [("yes", -0.7), ("no", -0.69)]),
+        body("no", [("no", -0.2), ("yes", -1.7)]),
+        body("yes", [("yes", -0.05), ("yes ", -0.01), ("no", -3.0)]),
+    ],
+    # a category missing from the top logprobs has a probability of 0
+    [body("yes", [("yes", -0.3), ("maybe", -1.0)]), body("no", [("no", -0.1)])],
+]
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    return ContextPrecision(log_relevance_by_context=True), BatchContextPrecision(
+        log_relevance_by_context=True
+    )
+
+
+@pytest.mark.parametrize("bodies", CASES)
+def test_batch_scores_match_context_precision(metrics, bodies):
+    metric, batch_metric = metrics
+    responses = iter(bodies)
+    metric._client = SimpleNamespace(
+        beta=SimpleNamespace(
+            chat=SimpleNamespace(
+                completions=SimpleNamespace(
+                    parse=lambda **kwargs: completion(next(responses))
+                )
+            )
+        )
+    )
+    contexts = [f"context {i}" for i in range(len(bodies))]
+    expected = metric(question="question", retrieved_context=contexts)
+    scores = batch_metric._aggregate(
+        [batch_metric._yes_probability(body) for body in bodies]
+    )
+    assert scores.keys() == expected.keys()
+    for key, value in expected.items():
+        assert scores[key] == pytest.approx(value)
+
+
+def test_yes_probability_without_category_logprobs(metrics):
+    _, batch_metric = metrics
+    assert math.isnan(batch_metric._yes_probability(body("yes", [("maybe", -0.1)])))
+    assert math.isnan(
+        batch_metric._yes_probability(
+            body("yes", [("yes", -math.inf), ("no", -math.inf)])
+        )
+    )
+
+
+def test_yes_probability_of_failed_requests(metrics):
+    _, batch_metric = metrics
+    assert math.isnan(batch_metric._yes_probability(None))
+    invalid = body("yes", [("yes", -0.1)])
+    invalid["choices"][0]["message"]["content"] = "not json"
+    assert math.isnan(batch_metric._yes_probability(invalid))
+
+
+class BatchClient:
+    """
+    OpenAI client whose batches end with the given statuses, the output of a batch
+    holds the responses of its first completed requests
+    """
+
+    def __init__(self, statuses, completed, bodies):
+        self.statuses = iter(statuses)
+        self.completed = completed
+        self.bodies = bodies
+        self.batches_created = []
+        self.files = SimpleNamespace(
+            create=lambda **kwargs: SimpleNamespace(id="input"),
+            content=lambda file_id: SimpleNamespace(text=self.outputs[file_id]),
+        )
+        self.batches = SimpleNamespace(create=self.create, retrieve=self.retrieve)
+        self.outputs = {}
+
+    def create(self, **kwargs):
+        batch_id = f"batch-{len(self.batches_created)}"
+        self.batches_created.append((batch_id, next(self.statuses)))
+        return SimpleNamespace(id=batch_id)
+
+    def retrieve(self, batch_id):
+        status = dict(self.batches_created)[batch_id]
+        lines = [
+            json.dumps(
+                {
+                    "custom_id": str(i),
+                    "response": {"status_code": 200, "body": self.bodies[i]},
+                }
+            )
+            for i in range(self.completed)
+        ]
+        self.outputs[batch_id] = "\n".join(lines)
+        return SimpleNamespace(
+            status=status,
+            output_file_id=None if status == "failed" else batch_id,
+            request_counts=SimpleNamespace(total=2, completed=self.completed, failed=0),
+        )
+
+
+def test_compute_batch_keeps_expired_and_failed_batches(metrics):
+    _, batch_metric = metrics
+    batch_metric.max_batch_size = 2
+    yes = body("yes", [("yes", 0.0)])
+    batch_metric._client = BatchClient(["expired", "failed"], 1, [yes, yes])
+    data = [
+        {"question": "q0", "retrieved_context": ["c0", "c1"]},
+        {"question": "q1", "retrieved_context": ["c2", "c3"]},
+    ]
+    expired, failed = batch_metric.compute_batch(data)
+    # the completed request of the expired batch is scored, the others are nan
+    assert expired["context_relevance_by_context"][0] == 1.0
+    assert math.isnan(expired["context_relevance_by_context"][1])
+    assert all(math.isnan(s) for s in failed["context_relevance_by_context"])
@@ -0,0 +1,68 @@
+import random
+
+import pytest
+from continuous_eval.metrics.retrieval.matching_strategy import RougeChunkMatch
+from rouge import Rouge
+
+from dataworkz.matching_strategy import CachedRougeChunkMatch, rouge_l_recall
+
+PAIRS = [
+    ("the cat sat on the mat", "the cat sat on the mat"),
+    ("the the the cat", "the cat the cat the"),
+    ("a a b b a a", "b a b a b"),
+    ("Revenue was $1,577.00 million.", "revenue was $1,577.00 million"),
+    ("First sentence. Second one, with commas!", "second one. first sentence"),
+    ("x. y. z", "z y x. x y z"),
+    ("no overlap here", "entirely different words"),
+    ("  spaced   out\nwords\there ", "spaced out words here"),
+    ("ends with a dot.", "ends with a dot."),
+    (" ", "word"),
+    ("word", " "),
+]
+
+
+def rouge_recall(hypothesis, reference):
+    return Rouge().get_scores(hypothesis, reference)[0]["rouge-l"]["r"]
+
+
+@pytest.mark.parametrize("hypothesis, reference", PAIRS)
+def test_rouge_l_recall_matches_rouge(hypothesis, reference):
+    assert rouge_l_recall(hypothesis, reference) == rouge_recall(hypothesis, reference)
+
+
+@pytest.mark.parametrize(
+    "hypothesis, reference", [("", "text"), ("text", ""), ("", ""), ("...", "text")]
+)
+def test_rouge_l_recall_rejects_empty(hypothesis, reference):
+    with pytest.raises(ValueError):
+        rouge_recall(hypothesis, reference)
+    with pytest.raises(ValueError):
+        rouge_l_recall(hypothesis, reference)
+
+
+def test_rouge_l_recall_matches_rouge_on_random_text():
+    rng = random.Random(0)
+    words = ["a", "b", "c", "the", "cat", "$10", "q3,", "x!", "a.", "."]
+    for _ in range(300):
+        hypothesis = " ".join(rng.choices(words, k=rng.randint(1, 40)))
+        reference = " ".join(rng.choices(words, k=rng.randint(1, 20)))
+        try:
+            expected = rouge_recall(hypothesis, reference)
+        except ValueError:
+            with pytest.raises(ValueError):
+                rouge_l_recall(hypothesis, reference)
+            continue
+        assert rouge_l_recall(hypothesis, reference) == expected, (
+            hypothesis,
+            reference,
+        )
+
+
+def test_cached_chunk_match_matches_rouge_chunk_match():
+    cached = CachedRougeChunkMatch()
+    reference = RougeChunkMatch()
+    pairs = PAIRS + [("", "text"), ("text", "")]
+    for retrieved, ground_truth in pairs + pairs:
+        assert cached.is_relevant(retrieved, ground_truth) == reference.is_relevant(
+            retrieved, ground_truth
+        )
@@ -0,0 +1,71 @@
+import random
+
+import pytest
+from continuous_eval.metrics.retrieval import PrecisionRecallF1, RankedRetrievalMetrics
+
+from dataworkz.matching_strategy import CachedRougeChunkMatch
+from dataworkz.retrieval_metrics import retrieval_scores
+
+CASES = [
+    # no retrieved chunks
+    ([], ["the cat sat"]),
+    ([], "a string ground truth"),
+    # duplicate retrieved chunks and duplicate ground truth components
+    (["the cat sat", "the cat sat", "dog"], ["the cat sat", "the cat sat"]),
+    (["a b c", "x y", "a b c d"], ["a b c", "x y", "a b c", "q"]),
+    # one chunk matching several components, several chunks matching one
+    (["a b c x y", "x y z", "x y"], ["a b c", "x y"]),
+    (["nothing relevant", "at all"], ["a b c", "x y"]),
+    # a string ground truth is iterated by character, like continuous_eval does
+    (["I", "a b", "zz", "$ 1"], "I a $1"),
+]
+
+
+def continuous_eval_scores(matching_strategy, retrieved_context, ground_truth_context):
+    datum = {
+        "retrieved_context": retrieved_context,
+        "ground_truth_context": ground_truth_context,
+    }
+    scores = PrecisionRecallF1(matching_strategy)(**datum)
+    scores.update(RankedRetrievalMetrics(matching_strategy)(**datum))
+    return scores
+
+
+def assert_same_scores(matching_strategy, retrieved_context, ground_truth_context):
+    expected = continuous_eval_scores(
+        matching_strategy, retrieved_context, ground_truth_context
+    )
+    scores = retrieval_scores(
+        matching_strategy, retrieved_context, ground_truth_context
+    )
+    assert list(scores) == list(expected)
+    assert scores == expected, (retrieved_context, ground_truth_context)
+
+
+@pytest.mark.parametrize("retrieved_context, ground_truth_context", CASES)
+def test_retrieval_scores_match_continuous_eval(
+    retrieved_context, ground_truth_context
+):
+    assert_same_scores(CachedRougeChunkMatch(), retrieved_context, ground_truth_context)
+
+
+@pytest.mark.parametrize("ground_truth_context", [[], ""])
+def test_retrieval_scores_without_ground_truth(ground_truth_context):
+    # the NDCG of continuous_eval divides by the ideal DCG of no ground truth
+    matching_strategy = CachedRougeChunkMatch()
+    with pytest.raises(ZeroDivisionError):
+        continuous_eval_scores(matching_strategy, ["a b"], ground_truth_context)
+    with pytest.raises(ZeroDivisionError):
+        retrieval_scores(matching_strategy, ["a b"], ground_truth_context)
+
+
+def test_retrieval_scores_match_continuous_eval_on_random_data():
+    rng = random.Random(0)
+    components = ["a b c", "x y", "q", "I", "a b c d", "y x", "zz", "q q"]
+    matching_strategy = CachedRougeChunkMatch()
+    for _ in range(300):
+        retrieved_context = rng.choices(components, k=rng.randint(0, 6))
+        ground_truth_context = rng.choices(components, k=rng.randint(1, 4))
+        if rng.random() < 0.3:
+            ground_truth_context = " ".join(ground_truth_context)
+        assert_same_scores(matching_strategy, retrieved_context, ground_truth_context)
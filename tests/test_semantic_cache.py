@@ -0,0 +1,146 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from dataworkz.semantic_cache import SemanticCache
+
+
+def unit(*values):
+    embedding = np.asarray(values, dtype=np.float32)
+    return embedding / np.linalg.norm(embedding)
+
+
+class Clock:
+    # ticks one second per call, so the least recently used entry is never a tie
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        self.now += 1
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr("time.time", clock)
+    return clock
+
+
+def test_save_load_round_trip(tmp_path):
+    path = str(tmp_path / "cache" / "answers")
+    cache = SemanticCache(path=path)
+    cache.put("sys1", "q1", {"answer": "a1"}, unit(1, 0, 0))
+    cache.put("sys1", "q2", {"answer": "a2"}, unit(0, 1, 0))
+    cache.put("sys2", "q3", {"answer": "a3"}, unit(1, 0, 0))
+    cache.save()
+
+    loaded = SemanticCache(path=path)
+    assert loaded._size == 3
+    assert loaded.get("sys1", "q1", unit(1, 0, 0)) == {"answer": "a1"}
+    assert loaded.get("sys1", "q2", unit(0, 1, 0)) == {"answer": "a2"}
+    assert loaded.get("sys2", "q3", unit(1, 0, 0)) == {"answer": "a3"}
+    assert loaded.get("sys2", "q2", unit(0, 1, 0)) is None
+
+
+def test_entries_are_kept_per_llm_provider(tmp_path):
+    path = str(tmp_path / "answers")
+    cache = SemanticCache(path=path)
+    cache.put("sys", "q", "answer of llm1", unit(1, 0), llm_provider_id="llm1")
+    assert cache.get("sys", "q", unit(1, 0), llm_provider_id="llm2") is None
+    cache.put("sys", "q", "answer of llm2", unit(1, 0), llm_provider_id="llm2")
+    cache.save()
+
+    loaded = SemanticCache(path=path)
+    for provider in ["llm1", "llm2"]:
+        answer = loaded.get("sys", "q", unit(1, 0), llm_provider_id=provider)
+        assert answer == f"answer of {provider}"
+    assert loaded.get("sys", "q", unit(1, 0), llm_provider_id="llm3") is None
+    assert loaded.get("sys", "q", unit(1, 0)) is None
+
+
+def test_load_keeps_the_most_recently_used(tmp_path):
+    path = str(tmp_path / "answers")
+    cache = SemanticCache(path=path)
+    for i in range(4):
+        cache.put("sys", f"q{i}", i, unit(*np.eye(4)[i]))
+    cache.get("sys", "q0", unit(1, 0, 0, 0))
+    cache.save()
+
+    loaded = SemanticCache(max_entries=2, path=path)
+    assert loaded._size == 2
+    assert loaded.get("sys", "q0", unit(1, 0, 0, 0)) == 0
+    assert loaded.get("sys", "q3", unit(0, 0, 0, 1)) == 3
+    assert loaded.get("sys", "q1", unit(0, 1, 0, 0)) is None
+
+
+def test_evicts_the_least_recently_used():
+    cache = SemanticCache(max_entries=2)
+    cache.put("sys", "q0", 0, unit(1, 0, 0))
+    cache.put("sys", "q1", 1, unit(0, 1, 0))
+    assert cache.get("sys", "q0", unit(1, 0, 0)) == 0
+    cache.put("sys", "q2", 2, unit(0, 0, 1))
+    assert cache._size == 2
+    assert cache.get("sys", "q0", unit(1, 0, 0)) == 0
+    assert cache.get("sys", "q1", unit(0, 1, 0)) is None
+    assert cache.get("sys", "q2", unit(0, 0, 1)) == 2
+
+
+def test_evicts_expired_entries_first(clock):
+    cache = SemanticCache(max_entries=2, ttl=12)
+    cache.put("sys", "q0", 0, unit(1, 0, 0))
+    clock.now += 5
+    cache.put("sys", "q1", 1, unit(0, 1, 0))
+    # q0 is the most recently used, but it has expired by the time q2 is cached
+    assert cache.get("sys", "q0", unit(1, 0, 0)) == 0
+    clock.now += 5
+    cache.put("sys", "q2", 2, unit(0, 0, 1))
+    assert cache.get("sys", "q1", unit(0, 1, 0)) == 1
+    assert cache.get("sys", "q2", unit(0, 0, 1)) == 2
+    assert cache._size == 2
+
+
+def test_failed_save_keeps_the_previous_cache(tmp_path, monkeypatch):
+    path = str(tmp_path / "answers")
+    cache = SemanticCache(path=path)
+    cache.put("sys", "q0", 0, unit(1, 0))
+    cache.save()
+    cache.put("sys", "q1", 1, unit(0, 1))
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(pickle, "dump", fail)
+    with pytest.raises(OSError):
+        cache.save()
+
+    assert list(tmp_path.iterdir()) == [tmp_path / "answers.pkl"]
+    loaded = SemanticCache(path=path)
+    assert loaded._size == 1
+    assert loaded.get("sys", "q0", unit(1, 0)) == 0
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        b"",
+        b"\x00not a pickle",
+        pickle.dumps({"values": [1, 2]}),
+        pickle.dumps(
+            {
+                "embeddings": np.eye(2, dtype=np.float32),
+                "system_ids": ["sys", "sys"],
+                "llm_provider_ids": ["llm", "llm"],
+                "values": [1, 2, 3],
+                "created": np.zeros(2),
+                "used": np.zeros(2),
+            }
+        ),
+    ],
+)
+def test_unreadable_cache_starts_empty(tmp_path, content):
+    (tmp_path / "answers.pkl").write_bytes(content)
+    cache = SemanticCache(path=str(tmp_path / "answers"))
+    assert cache._size == 0
+    assert cache.get("sys", "q", unit(1, 0)) is None